@@ -0,0 +1,184 @@
+"""Кэш страниц с инвалидацией по поколениям.
+
+У каждой области (главная, сообщество, профиль) есть номер поколения.
+Он входит в ключ закэшированной страницы, а сигналы изменения
+записей и комментариев увеличивают его, поэтому страницы живут
+долго, но обновляются сразу после изменений. Ещё в ключ и в ETag
+входит версия кода и шаблонов release(): после выкладки или правки
+шаблона старая разметка не отдаётся.
+
+Попадания и промахи считаются в памяти процесса метриками
+yatube/metrics.py, а не в общем кэше: запись на каждый показ страницы
+выстроила бы все процессы в очередь за блокировкой кэша.
+"""
+import hashlib
+import os
+import re
+import time
+from functools import lru_cache, wraps
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from yatube import metrics
+
+GENERATION_PREFIX = 'generation'
+PAGE_PREFIX = 'page'
+STATS_SAMPLE = re.compile(r'view="([^"]*)",result="(hit|miss)"')
+
+cached_views = set()
+
+
+def _generation_key(scope):
+    return f'{GENERATION_PREFIX}:{scope}'
+
+
+def _new_generation():
+    # Отметка времени, а не 1: если ключ поколения вытеснят из кэша,
+    # новое поколение не совпадёт со старыми страницами.
+    return int(time.time() * 1000)
+
+
+def generations(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    result = []
+    for key in keys:
+        if key not in found:
+            generation = _new_generation()
+            # Второе чтение нужно, только если другой процесс успел раньше
+            if not cache.add(key, generation, timeout=None):
+                generation = cache.get(key)
+            found[key] = generation
+        result.append(found[key])
+    return result
+
+
+def bump(*scopes):
+    """Начинает новое поколение областей, их страницы устаревают."""
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), timeout=None)
+
+
+def stats():
+    """Попадания и промахи кэша страниц по представлениям, всех процессов."""
+    counts = {name: {'hit': 0, 'miss': 0} for name in cached_views}
+    for key, value in metrics.PAGE_CACHE_REQUESTS.samples(metrics.collect()):
+        match = STATS_SAMPLE.search(key)
+        if match:
+            view, outcome = match.groups()
+            counts.setdefault(view, {'hit': 0, 'miss': 0})[outcome] = (
+                int(value))
+    result = {}
+    for name, outcomes in sorted(counts.items()):
+        hits, misses = outcomes['hit'], outcomes['miss']
+        total = hits + misses
+        result[name] = {
+            'hits': hits,
+            'misses': misses,
+            'ratio': hits / total if total else 0.0,
+        }
+    return result
+
+
+def _source_roots():
+    roots = {os.path.dirname(import_module(settings.ROOT_URLCONF).__file__)}
+    for config in settings.TEMPLATES:
+        roots.update(config.get('DIRS', ()))
+    roots.update(config.path for config in apps.get_app_configs()
+                 if config.path.startswith(settings.BASE_DIR))
+    return sorted(roots)
+
+
+def release():
+    """Версия кода и шаблонов для ключей страниц и ETag.
+
+    RELEASE из настроек, а без него - хеш файлов проекта.
+    """
+    return str(settings.RELEASE or _sources_digest())
+
+
+@lru_cache()
+def _sources_digest():
+    """Хеш путей, размеров и времени изменения файлов .py и .html,
+    считается раз на процесс."""
+    digest = hashlib.md5()
+    for root in _source_roots():
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories.sort()
+            for name in sorted(files):
+                if not name.endswith(('.py', '.html')):
+                    continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                digest.update(f'{os.path.relpath(path, settings.BASE_DIR)}:'
+                              f'{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()[:12]
+
+
+def _viewer(request):
+    return request.user.pk if request.user.is_authenticated else 'anon'
+
+
+def make_etag(request, scopes):
+    """ETag страницы: версия кода, зритель, кука CSRF и поколения областей.
+
+    Маскированный токен CSRF в форме страницы годится, пока не сменилась
+    кука, поэтому с ней в ETag ответ 304 не оставит устаревший токен.
+    """
+    values = [release(), _viewer(request),
+              request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+              *generations(scopes)]
+    raw = '.'.join(str(value) for value in values)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def scope_etag(*scopes):
+    """Функция ETag для django.views.decorators.http.condition."""
+    def etag(request, *args, **kwargs):
+        return make_etag(request, [scope.format(**kwargs) for scope in scopes])
+    return etag
+
+
+def cached_page(*scopes):
+    """Кэширует страницу до смены поколения одной из областей.
+
+    Области задаются шаблонами, которые заполняются аргументами
+    представления из URL, например 'group:{slug}'.
+    """
+    def decorator(view):
+        cached_views.add(view.__name__)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            names = [scope.format(**kwargs) for scope in scopes]
+            version = '.'.join(str(value) for value in generations(names))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = (f'{PAGE_PREFIX}:{view.__name__}:{release()}:{version}:'
+                   f'{_viewer(request)}:{path}')
+
+            cached = cache.get(key)
+            if cached is not None:
+                metrics.PAGE_CACHE_REQUESTS.inc(view=view.__name__,
+                                                result='hit')
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            metrics.PAGE_CACHE_REQUESTS.inc(view=view.__name__,
+                                            result='miss')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']),
+                          settings.POSTS_PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
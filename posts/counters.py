@@ -0,0 +1,66 @@
+"""Денормализованные счётчики записей, комментариев и подписок.
+
+На путях записи счётчики меняются атомарным UPDATE с F-выражением,
+команда recount_counters пересчитывает их пачками с нуля.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+BATCH_SIZE = 1000
+
+
+def change(model, pk, field, delta):
+    """Сдвигает счётчик field у строки model на delta."""
+    if pk is None:
+        return
+    lookup = 'user' if model is UserStats else 'pk'
+    queryset = model.objects.filter(**{lookup: pk})
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+def _recount(model, field, related, fk, batch_size, outer='pk'):
+    counted = (
+        related.objects.filter(**{fk: OuterRef(outer)})
+        .order_by()
+        .values(fk)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    value = Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+    pks = model.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        batch = list(pks.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            model.objects.filter(pk__in=batch).update(**{field: value})
+        last = batch[-1]
+
+
+def recount(batch_size=BATCH_SIZE):
+    """Пересчитывает все счётчики пачками по batch_size строк."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True)
+    # Django 2.2 не урезает явный batch_size до предела параметров SQLite
+    fields = [field for field in UserStats._meta.concrete_fields
+              if not field.primary_key]
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=min(batch_size,
+                       connection.ops.bulk_batch_size(fields, [])),
+        ignore_conflicts=True,
+    )
+    _recount(Post, 'comments_count', Comment, 'post', batch_size)
+    _recount(Group, 'posts_count', Post, 'group', batch_size)
+    for field, related, fk in (
+        ('posts_count', Post, 'author'),
+        ('followers_count', Follow, 'author'),
+        ('following_count', Follow, 'user'),
+    ):
+        _recount(UserStats, field, related, fk, batch_size, outer='user')
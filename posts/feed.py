@@ -0,0 +1,155 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора.
+Посты авторов, у которых подписчиков не меньше
+FEED_FANOUT_MAX_FOLLOWERS, не раскладываются, а подмешиваются
+при чтении ленты (pull on read).
+
+У ленты каждого читателя своя область кэша 'feed:<id>', её сбрасывают
+изменения у авторов из подписок. Изменения популярных авторов
+сбрасывают общую область PULLED_SCOPE тех, кто на них подписан.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from . import caching
+from .models import FeedItem, Follow, Post, UserStats
+
+BATCH_SIZE = 1000
+PULLED_SCOPE = 'feed:pulled'
+
+
+def fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 1000)
+
+
+def is_pulled(author_id):
+    """Посты автора читаются из Post напрямую, без раскладки."""
+    return UserStats.objects.filter(
+        user=author_id, followers_count__gte=fanout_limit()).exists()
+
+
+def dropped_below_limit(author_id):
+    """Автор только что опустился ниже порога раскладки."""
+    return UserStats.objects.filter(
+        user=author_id, followers_count=fanout_limit() - 1).exists()
+
+
+def _bulk_insert(items):
+    FeedItem.objects.bulk_create(
+        items, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(FeedItem(user_id=user_id, post=post)
+                 for user_id in followers.iterator())
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(
+        author=author_id).values_list('pk', flat=True)
+    _bulk_insert(FeedItem(user_id=user_id, post_id=post_id)
+                 for post_id in posts.iterator())
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    FeedItem.objects.filter(user=user_id, post__author=author_id).delete()
+
+
+def _insert_select(items):
+    """Вставляет пары (user_id, post_id) из QuerySet одним запросом,
+    пропуская те, что уже есть в лентах."""
+    select, params = items.query.sql_with_params()
+    insert = connection.ops.insert_statement(ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{insert} {FeedItem._meta.db_table} '
+                       f'(user_id, post_id) {select}', params)
+
+
+def backfill_followers(author_id):
+    """Раскладывает посты автора всем подписчикам.
+
+    Нужно, когда автор опускается ниже порога раскладки и его посты
+    перестают подмешиваться при чтении. Подписчиков у такого автора
+    почти FEED_FANOUT_MAX_FOLLOWERS, поэтому ленты заполняются одним
+    INSERT ... SELECT, а не запросами на каждого подписчика.
+    """
+    if is_pulled(author_id):
+        return
+    _insert_select(Follow.objects.filter(
+        author=author_id, author__posts__isnull=False,
+    ).values_list('user_id', 'author__posts__pk'))
+
+
+def pulled_authors(user):
+    """Авторы из подписок user, чьи посты читаются при запросе ленты."""
+    return Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=fanout_limit(),
+    ).values_list('author_id', flat=True)
+
+
+def follow_feed(user):
+    """QuerySet постов ленты подписок пользователя."""
+    pulled = list(pulled_authors(user))
+    materialized = FeedItem.objects.filter(user=user).values('post')
+    if not pulled:
+        return Post.objects.filter(pk__in=materialized)
+    return Post.objects.filter(
+        Q(pk__in=materialized) | Q(author__in=pulled))
+
+
+def scope(user_id):
+    """Область кэша ленты подписок читателя."""
+    return f'feed:{user_id}'
+
+
+def expire(*author_ids):
+    """Ленты подписчиков авторов устаревают: у авторов новый пост,
+    правка, комментарий или новое имя."""
+    pulled = set(UserStats.objects.filter(
+        user__in=author_ids, followers_count__gte=fanout_limit(),
+    ).values_list('user_id', flat=True))
+    followers = Follow.objects.filter(author__in=[
+        author_id for author_id in author_ids if author_id not in pulled
+    ]).values_list('user_id', flat=True).distinct()
+    scopes = [scope(user_id) for user_id in followers.iterator()]
+    if pulled:
+        scopes.append(PULLED_SCOPE)
+    caching.bump(*scopes)
+
+
+def follow_feed_etag(request):
+    """ETag ленты подписок: одно чтение кэша на любое число авторов."""
+    if not request.user.is_authenticated:
+        return None
+    scopes = [scope(request.user.pk)]
+    if pulled_authors(request.user).exists():
+        scopes.append(PULLED_SCOPE)
+    return caching.make_etag(request, scopes)
+
+
+def rebuild():
+    """Пересобирает все ленты из Follow. Возвращает число подписок.
+
+    Ленты заполняются одним INSERT ... SELECT: обход подписок
+    по одной на миллионах строк занимал бы часы.
+    """
+    FeedItem.objects.all().delete()
+    pulled = UserStats.objects.filter(
+        followers_count__gte=fanout_limit()).values('user_id')
+    items = (Follow.objects.exclude(author__in=pulled)
+             .filter(author__posts__isnull=False)
+             .values_list('user_id', 'author__posts__pk'))
+    _insert_select(items)
+    return Follow.objects.count()
@@ -1,5 +1,11 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+
+from yatube import metrics
+
 from .models import Post, Comment
+from .uploads import sanitize
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +13,25 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файл сверх предела обработчик загрузки заменил пустым.
+        image = self.files.get('image')
+        self.image_too_large = getattr(image, 'too_large', False)
+        if self.image_too_large:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.image_too_large:
+            limit = settings.POSTS_UPLOAD_MAX_BYTES // (1024 * 1024)
+            raise forms.ValidationError(f'Файл больше {limit} МБ.')
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            with metrics.UPLOAD_SECONDS.time():
+                image = sanitize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,165 @@
+"""Сборка мусора в каталогах картинок постов и их миниатюр.
+
+Живые имена - картинки постов и все их миниатюры - выписываются
+пачками во временный индекс SQLite на диске, поэтому память не растёт
+с числом постов. Затем каталоги обходятся потоком, и файлы, которых
+нет в индексе, считаются лишними.
+
+Работать можно под нагрузкой:
+- файлы моложе min_age не трогаются, их могли только что загрузить;
+  повторная загрузка и повторная подготовка миниатюр обновляют время
+  изменения существующего файла;
+- перед удалением время изменения читается заново, а картинку ещё
+  раз ищут в базе;
+- после удаления миниатюр процессы сайта забывают их, см.
+  thumbnails.discard();
+- удаление ограничено по скорости.
+"""
+import os
+import sqlite3
+import time
+from itertools import islice
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import thumbnails
+from .models import MediaBlob, Post
+from .storage import content_storage
+
+BATCH_SIZE = 1000
+
+
+class LiveIndex:
+    """Множество живых имён файлов в SQLite во временном каталоге."""
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=OFF')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.execute(
+            'CREATE TABLE live (name TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def add(self, names):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO live (name) VALUES (?)',
+                ((name,) for name in names))
+
+    def missing(self, names):
+        found = set()
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows = self.connection.execute(
+                'SELECT name FROM live WHERE name IN (%s)'
+                % ', '.join('?' * len(chunk)), chunk)
+            found.update(name for name, in rows)
+        return [name for name in names if name not in found]
+
+    def close(self):
+        self.connection.close()
+
+
+def build_index(index, batch_size=BATCH_SIZE):
+    """Выписывает в индекс картинки постов и их миниатюры."""
+    images = (Post.objects.exclude(image='').exclude(image=None)
+              .order_by('pk').values_list('pk', 'image', 'image_width'))
+    last = 0
+    while True:
+        rows = list(images.filter(pk__gt=last)[:batch_size])
+        if not rows:
+            break
+        last = rows[-1][0]
+        names = []
+        for _, image, width in rows:
+            names.append(image)
+            names.extend(thumbnails.backend.variant_file(image, variant).name
+                         for variant in thumbnails.variants(width))
+        index.add(names)
+
+
+def roots():
+    """Каталоги под MEDIA_ROOT, где лежат картинки постов и миниатюры."""
+    upload_to = Post._meta.get_field('image').upload_to
+    return [upload_to.rstrip('/'),
+            thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')]
+
+
+def walk(root):
+    """Файлы каталога root (относительно MEDIA_ROOT) и их stat, потоком."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(settings.MEDIA_ROOT,
+                                              directory))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = f'{directory}/{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    yield name, entry.stat(follow_symlinks=False)
+
+
+def orphans(index, min_age, batch_size=BATCH_SIZE):
+    """Лишние файлы старше min_age секунд: пары (имя, размер)."""
+    cutoff = time.time() - min_age
+    for root in roots():
+        files = ((name, stat) for name, stat in walk(root)
+                 if stat.st_mtime < cutoff)
+        while True:
+            batch = dict(islice(files, batch_size))
+            if not batch:
+                break
+            for name in index.missing(list(batch)):
+                yield name, batch[name].st_size
+
+
+def _is_fresh(storage, name, cutoff):
+    """Файл изменён после cutoff или его уже нет."""
+    try:
+        return os.path.getmtime(storage.path(name)) >= cutoff
+    except FileNotFoundError:
+        return True
+
+
+def delete(name, min_age=0):
+    """Удаляет лишний файл, если он всё ещё никому не нужен.
+
+    Время изменения и ссылки проверяются прямо перед удалением:
+    пока шёл обход, файл могли загрузить заново.
+    """
+    cutoff = time.time() - min_age
+    if name.startswith(thumbnail_settings.THUMBNAIL_PREFIX):
+        if _is_fresh(default.storage, name, cutoff):
+            return False
+        default.storage.delete(name)
+        default.kvstore.delete(ImageFile(name, default.storage),
+                               delete_thumbnails=False)
+        thumbnails.discard()
+        return True
+    if _is_fresh(content_storage, name, cutoff):
+        return False
+    if (MediaBlob.objects.filter(name=name, refs__gt=0).exists()
+            or Post.objects.filter(image=name).exists()):
+        return False
+    content_storage.delete(name)
+    MediaBlob.objects.filter(name=name, refs=0).delete()
+    return True
+
+
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1 / per_second if per_second else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
@@ -0,0 +1,40 @@
+"""Хранилище метаданных sorl-thumbnail только в кэше Django.
+
+Стандартное хранилище sorl пишет в таблицу thumbnail_kvstore основной
+базы. Миниатюры же готовят фоновые потоки (см. posts/thumbnails.py),
+и запись из них в SQLite конкурировала бы с записью из запросов.
+Метаданные можно восстановить по самим файлам, поэтому их достаточно
+держать в общем кэше без срока жизни.
+"""
+from django.core.cache import caches
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+
+class KVStore(KVStoreBase):
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[settings.THUMBNAIL_CACHE]
+
+    def get_many(self, image_files):
+        """Найденные в хранилище файлы по ключам, одним чтением кэша."""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        found = self.cache.get_many(keys)
+        return {keys[key]: deserialize_image_file(value)
+                for key, value in found.items()}
+
+    def _get_raw(self, key):
+        return self.cache.get(key)
+
+    def _set_raw(self, key, value):
+        self.cache.set(key, value, None)
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        # Кэш не умеет перечислять ключи, поэтому команды
+        # thumbnail cleanup и clear работают только с файлами.
+        return []
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from yatube.cache import SQLiteCache
+
+PAYLOAD = b'x' * 20000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает LocMemCache, FileBasedCache и SQLiteCache: '
+            'скорость get/set и число пересчётов при истечении ключа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=1000,
+                            help='Сколько ключей писать и читать.')
+        parser.add_argument('--threads', type=int, default=16,
+                            help='Сколько потоков одновременно просят '
+                                 'истёкший ключ.')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            backends = {
+                'locmem': LocMemCache('bench', {}),
+                'filebased': FileBasedCache(
+                    os.path.join(directory, 'files'), {}),
+                'sqlite': SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'), {}),
+            }
+            self.stdout.write(
+                'backend      set, op/s    get, op/s   recomputes')
+            for name, cache in backends.items():
+                cache.clear()
+                set_rate = self.rate(
+                    lambda key: cache.set(key, PAYLOAD), options['keys'])
+                get_rate = self.rate(cache.get, options['keys'])
+                recomputes = self.stampede(cache, options['threads'])
+                self.stdout.write(f'{name:<10} {set_rate:>11.0f} '
+                                  f'{get_rate:>12.0f} {recomputes:>12}')
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @staticmethod
+    def rate(func, count):
+        started = time.perf_counter()
+        for i in range(count):
+            func(f'key:{i}')
+        return count / (time.perf_counter() - started)
+
+    @staticmethod
+    def stampede(cache, threads):
+        """Сколько раз страницу пересчитали, когда ключ истёк у всех."""
+        cache.set('page', PAYLOAD, timeout=-1)
+        calls = []
+
+        def render():
+            calls.append(1)
+            time.sleep(0.1)
+            return PAYLOAD
+
+        workers = [threading.Thread(target=cache.get_or_set,
+                                    args=('page', render))
+                   for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return len(calls)
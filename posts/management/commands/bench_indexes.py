@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.benchmark import (add_database_argument, measure,
+                             scratch_database, seed)
+from posts.models import Comment, Follow, Post, User
+
+INDEXED_MODELS = (Post, Comment, Follow)
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу и показывает планы и время горячих запросов '
+            'без составных индексов и с ними.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Повторов на каждое измерение.')
+        add_database_argument(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options['database']):
+            self.run(options)
+
+    def run(self, options):
+        seed(users=options['users'], groups=options['groups'],
+             posts=options['posts'], comments=options['comments'],
+             follows=options['follows'], stdout=self.stdout)
+        queries = self.hot_queries()
+
+        self.set_indexes(False)
+        try:
+            self.report('Без составных индексов', queries, options['repeat'])
+        finally:
+            self.set_indexes(True)
+        self.report('С составными индексами', queries, options['repeat'])
+
+    @staticmethod
+    def hot_queries():
+        post = Comment.objects.values_list('post', flat=True).first()
+        user = User.objects.order_by('pk').last()
+        group_id = Post.objects.exclude(group=None).values_list(
+            'group', flat=True).first()
+        feed = ('-pub_date', '-pk')
+        return {
+            'Лента': Post.objects.order_by(*feed)[:11],
+            'Записи автора': Post.objects.filter(
+                author=user).order_by(*feed)[:11],
+            'Записи сообщества': Post.objects.filter(
+                group=group_id).order_by(*feed)[:11],
+            'Комментарии к посту': Comment.objects.filter(
+                post=post).order_by('created'),
+            'Подписки пользователя': Follow.objects.filter(user=user),
+            'Подписчики автора': Follow.objects.filter(author=user),
+        }
+
+    @staticmethod
+    def set_indexes(enabled):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    if enabled:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+
+    def report(self, title, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in queries.items():
+            timing = measure(lambda: list(queryset.all()), repeat)
+            self.stdout.write(f'{name}: {timing:.2f} ms')
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f'    {line}')
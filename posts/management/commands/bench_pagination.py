@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from posts.benchmark import (add_database_argument, measure,
+                             scratch_database, seed)
+from posts.models import Post
+from posts.paginators import POSTS_PER_PAGE, CursorPaginator, encode_cursor
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время OFFSET-пагинации и курсорной пагинации '
+            'ленты на первой и глубоких страницах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=3000000,
+                            help='Сколько постов должно быть в таблице.')
+        parser.add_argument('--pages', default='1,100,10000',
+                            help='Номера страниц через запятую.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Повторов на каждое измерение.')
+        add_database_argument(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options['database']):
+            self.run(options)
+
+    def run(self, options):
+        seed(posts=options['posts'], stdout=self.stdout)
+        pages = [int(number) for number in options['pages'].split(',')]
+        post_list = Post.objects.all()
+
+        self.stdout.write('    page   numbered, ms   cursor, ms')
+        for number in pages:
+            numbered = measure(
+                lambda: list(Paginator(post_list, POSTS_PER_PAGE)
+                             .page(number).object_list),
+                options['repeat'],
+            )
+            token = self.cursor_for(post_list, number)
+            cursor = measure(
+                lambda: CursorPaginator(post_list).get_page(after=token),
+                options['repeat'],
+            )
+            self.stdout.write(f'{number:>8} {numbered:>14.2f} {cursor:>12.2f}')
+
+    @staticmethod
+    def cursor_for(post_list, number):
+        """Токен, с которого начинается страница number."""
+        if number <= 1:
+            return None
+        last = post_list.order_by('-pub_date', '-pk')[
+            (number - 1) * POSTS_PER_PAGE - 1]
+        return encode_cursor(last)
@@ -0,0 +1,89 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+
+from posts.benchmark import add_database_argument, scratch_database, seed
+from posts.models import Comment, Post, User
+
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+                   'busy_timeout': 0}
+
+
+class Command(BaseCommand):
+    help = ('Нагружает базу параллельными чтениями ленты и записью '
+            'комментариев с PRAGMA по умолчанию и из настроек.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--posts', type=int, default=100000)
+        add_database_argument(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options['database']):
+            self.run(options)
+
+    def run(self, options):
+        seed(users=100, groups=10, posts=options['posts'],
+             stdout=self.stdout)
+        tuned = settings.DATABASES['default'].get('PRAGMAS', {})
+        self.stdout.write(
+            'pragmas   reads/s   writes/s   errors')
+        for name, pragmas in (('default', DEFAULT_PRAGMAS),
+                              ('tuned', tuned)):
+            reads, writes, errors = self.run_load(pragmas, options)
+            seconds = options['seconds']
+            self.stdout.write(f'{name:<8} {reads / seconds:>8.0f} '
+                              f'{writes / seconds:>10.0f} {errors:>8}')
+
+    def run_load(self, pragmas, options):
+        connection.close()
+        connection.settings_dict['PRAGMAS'] = pragmas
+        user = User.objects.order_by('pk').first()
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+        deadline = time.monotonic() + options['seconds']
+
+        def read():
+            list(Post.objects.select_related('author', 'group')[:10])
+            return 'reads'
+
+        def write():
+            post_id = post_ids[int(time.monotonic() * 1000) % len(post_ids)]
+            Comment.objects.bulk_create([
+                Comment(post_id=post_id, author=user, text='Нагрузка')])
+            return 'writes'
+
+        # Процессы, а не потоки: как у воркеров WSGI, и GIL не мешает.
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        connections.close_all()
+        processes = [
+            context.Process(target=_worker, args=(action, deadline, results))
+            for action, count in ((read, options['readers']),
+                                  (write, options['writers']))
+            for _ in range(count)
+        ]
+        for process in processes:
+            process.start()
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+        return totals['reads'], totals['writes'], totals['errors']
+
+
+def _worker(action, deadline, results):
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    while time.monotonic() < deadline:
+        try:
+            counts[action()] += 1
+        except OperationalError:
+            counts['errors'] += 1
+    connections.close_all()
+    results.put(counts)
@@ -0,0 +1,104 @@
+import io
+import multiprocessing
+import resource
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import load_handler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from PIL import Image, ImageOps
+
+from posts.forms import PostForm
+
+DEFAULT_HANDLERS = (
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+)
+
+
+class Command(BaseCommand):
+    help = ('Параллельно загружает большие картинки и сравнивает пиковую '
+            'память процесса при полном декодировании и при проверке '
+            'из posts/uploads.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=8,
+                            help='Сколько картинок загружать одновременно.')
+        parser.add_argument('--width', type=int, default=6000)
+        parser.add_argument('--height', type=int, default=4000)
+
+    def handle(self, *args, **options):
+        payload = self.make_jpeg(options['width'], options['height'])
+        self.stdout.write(
+            f'Картинка {options["width"]}x{options["height"]}, '
+            f'{len(payload) / 1024 / 1024:.1f} МБ, '
+            f'загрузок одновременно: {options["uploads"]}')
+        self.stdout.write('pipeline       peak RSS, МБ   seconds')
+        context = multiprocessing.get_context('fork')
+        for name, target in (('full decode', _full_decode),
+                             ('bounded', _bounded)):
+            results = context.Queue()
+            # Каждый замер в своём процессе: ru_maxrss не уменьшается.
+            process = context.Process(
+                target=_measure,
+                args=(target, payload, options['uploads'], results))
+            process.start()
+            peak, seconds = results.get()
+            process.join()
+            self.stdout.write(f'{name:<13} {peak:>13.0f} {seconds:>9.2f}')
+
+    @staticmethod
+    def make_jpeg(width, height):
+        gradient = Image.linear_gradient('L').resize((width, height))
+        image = Image.merge('RGB', (gradient, gradient.rotate(90),
+                                    gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90 градусов
+        content = io.BytesIO()
+        image.save(content, 'JPEG', quality=90, exif=exif)
+        return content.getvalue()
+
+
+def _request(payload, handlers):
+    image = SimpleUploadedFile('big.jpg', payload, 'image/jpeg')
+    request = RequestFactory().post('/new/', {'text': 'Нагрузка',
+                                              'image': image})
+    request.upload_handlers = [load_handler(path, request)
+                               for path in handlers]
+    return request
+
+
+def _full_decode(payload):
+    request = _request(payload, DEFAULT_HANDLERS)
+    image = Image.open(request.FILES['image'])
+    image = ImageOps.exif_transpose(image)
+    side = settings.POSTS_IMAGE_MAX_SIDE
+    image.thumbnail((side, side))
+    image.save(io.BytesIO(), 'JPEG', quality=90)
+
+
+def _bounded(payload):
+    request = _request(payload, settings.FILE_UPLOAD_HANDLERS)
+    form = PostForm(request.POST, files=request.FILES)
+    if not form.is_valid():
+        raise ValueError(form.errors.as_text())
+    form.cleaned_data['image'].read()
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(target, payload, uploads, results):
+    before = _rss_mb()
+    started = time.perf_counter()
+    workers = [threading.Thread(target=target, args=(payload,))
+               for _ in range(uploads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((_rss_mb() - before, time.perf_counter() - started))
@@ -0,0 +1,252 @@
+import json
+import logging
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from posts.benchmark import percentile
+from posts.models import Follow, Group, Post, User
+from posts.synthetic import ensure
+
+METRICS = ('p50', 'p95', 'p99', 'queries', 'memory_kb')
+# Разница во времени меньше этой считается шумом
+NOISE_MS = 1.0
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все страницы posts и about, регистрацию и вход '
+            'через тестовый клиент на большой базе: аноним и '
+            'пользователь, холодный и прогретый кэш. Сохраняет эталон '
+            'в JSON и сравнивает с ним.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000,
+                            help='Сколько постов должно быть в базе, '
+                                 'недостающие создаются как в '
+                                 'generate_data; 0 - база как есть.')
+        parser.add_argument('--repeat', type=int, default=30,
+                            help='Запросов на каждое измерение.')
+        parser.add_argument('--save', metavar='PATH',
+                            help='Записать результаты как эталон.')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='Сравнить с эталоном и завершиться '
+                                 'ошибкой при регрессии.')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Допустимый рост показателя, в процентах.')
+        parser.add_argument('--metrics', default='p50,queries,memory_kb',
+                            help='Сравниваемые показатели через запятую, '
+                                 'из ' + ', '.join(METRICS) + '.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть не меньше 1.')
+        metrics = options['metrics'].split(',')
+        unknown = set(metrics) - set(METRICS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные показатели: {", ".join(sorted(unknown))}')
+        baseline = self.load(options['compare'])
+        ensure(options['posts'], stdout=self.stdout)
+        if not Post.objects.exists():
+            raise CommandError('В базе нет постов, укажите --posts.')
+
+        # 404 и медленные запросы здесь ожидаемы, их журнал только мешает
+        loggers = [logging.getLogger(name)
+                   for name in ('django.request', 'yatube.slowlog')]
+        for logger in loggers:
+            logger.disabled = True
+        try:
+            results = self.run(options['repeat'])
+        finally:
+            for logger in loggers:
+                logger.disabled = False
+
+        report = {
+            'posts': Post.objects.count(),
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as target:
+                json.dump(report, target, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Эталон записан в {options["save"]}')
+        if baseline is not None:
+            self.compare(baseline, results, metrics, options['threshold'])
+
+    @staticmethod
+    def load(path):
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as source:
+                return json.load(source)
+        except FileNotFoundError:
+            raise CommandError(f'Эталон {path} не найден.')
+
+    def run(self, repeat):
+        reader, endpoints = self.endpoints()
+        results = []
+        self.stdout.write(
+            'view                     user  cache   status   p50, ms   '
+            'p95, ms   p99, ms  queries  memory, KB')
+        for user in ('anon', 'user'):
+            client = Client()
+            if user == 'user':
+                client.force_login(reader)
+            for warm in (False, True):
+                for name, method, url, data, login in endpoints:
+                    if login and user == 'anon':
+                        continue
+                    result = self.measure(client, method, url, data,
+                                          warm, repeat)
+                    result.update(view=name, user=user,
+                                  cache='warm' if warm else 'cold')
+                    results.append(result)
+                    self.write_result(result)
+        return results
+
+    def endpoints(self):
+        """Читатель и список (имя, метод, адрес, данные, нужен вход).
+
+        Для адресов берутся самые тяжёлые объекты базы: самое большое
+        сообщество, самый читаемый автор, самый обсуждаемый пост.
+        Запросы с записью (POST и метод write - GET, который меняет
+        данные) выполняются в откатываемой транзакции.
+        """
+        with_posts = User.objects.filter(posts__isnull=False).distinct()
+        reader = with_posts.order_by('-stats__following_count', 'pk').first()
+        author = with_posts.exclude(pk=reader.pk).order_by(
+            '-stats__followers_count', 'pk').first() or reader
+        group = Group.objects.order_by('-posts_count', 'pk').first()
+        post = Post.objects.select_related('author').order_by(
+            '-comments_count', 'pk').first()
+        own = reader.posts.order_by('-pk').first()
+        followed = Follow.objects.filter(user=reader).select_related(
+            'author').first()
+        unfollow = followed.author if followed else author
+        word = post.text.split()[0]
+
+        def url(name, *args):
+            return reverse(name, args=args)
+
+        post_args = (post.author.username, post.pk)
+        endpoints = [
+            ('index', 'get', url('index'), {}, False),
+            ('group', 'get', url('group', group.slug) if group else None,
+             {}, False),
+            ('search', 'get', url('search'), {'q': word}, False),
+            ('profile', 'get', url('profile', author.username), {}, False),
+            ('post', 'get', url('post', *post_args), {}, False),
+            ('404', 'get', url('404'), {}, False),
+            ('500', 'get', url('500'), {}, False),
+            ('about:author', 'get', url('about:author'), {}, False),
+            ('about:tech', 'get', url('about:tech'), {}, False),
+            ('signup', 'get', url('signup'), {}, False),
+            ('login', 'get', url('login'), {}, False),
+            ('new_post', 'get', url('new_post'), {}, True),
+            ('follow_index', 'get', url('follow_index'), {}, True),
+            ('post_edit', 'get', url('post_edit', reader.username, own.pk),
+             {}, True),
+            ('new_post', 'post', url('new_post'),
+             {'text': 'Замер', 'group': ''}, True),
+            ('add_comment', 'post', url('add_comment', *post_args),
+             {'text': 'Замер'}, True),
+            ('profile_follow', 'write',
+             url('profile_follow', author.username), {}, True),
+            ('profile_unfollow', 'write',
+             url('profile_unfollow', unfollow.username), {}, True),
+        ]
+        return reader, [
+            (f'{name} POST' if method == 'post' else name,
+             method, address, data, login)
+            for name, method, address, data, login in endpoints
+            if address is not None
+        ]
+
+    @staticmethod
+    def request(client, method, url, data):
+        if method == 'get':
+            return client.get(url, data)
+        with transaction.atomic():
+            response = client.get(url) if method == 'write' else (
+                client.post(url, data))
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, client, method, url, data, warm, repeat):
+        """Перцентили времени, запросы к базе и пик памяти на запрос."""
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        def run():
+            if not warm:
+                cache.clear()
+            queries.append(0)
+            started = time.perf_counter()
+            response = self.request(client, method, url, data)
+            return response, (time.perf_counter() - started) * 1000
+
+        if warm:
+            self.request(client, method, url, data)
+        timings = []
+        with connection.execute_wrapper(count):
+            for _ in range(repeat):
+                response, elapsed = run()
+                timings.append(elapsed)
+        # Память отдельно: трассировка замедляет запросы в разы
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            run()
+            memory = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+        return {
+            'status': response.status_code,
+            'p50': round(percentile(timings, 0.5), 3),
+            'p95': round(percentile(timings, 0.95), 3),
+            'p99': round(percentile(timings, 0.99), 3),
+            'queries': int(percentile(queries[:repeat], 0.5)),
+            'memory_kb': round(memory / 1024, 1),
+        }
+
+    def write_result(self, result):
+        self.stdout.write(
+            f'{result["view"]:<24} {result["user"]:>5} {result["cache"]:>6} '
+            f'{result["status"]:>8} {result["p50"]:>9.2f} '
+            f'{result["p95"]:>9.2f} {result["p99"]:>9.2f} '
+            f'{result["queries"]:>8} {result["memory_kb"]:>11.1f}')
+
+    def compare(self, baseline, results, metrics, threshold):
+        """Регрессия - рост показателя больше threshold процентов."""
+        before = {(item['view'], item['user'], item['cache']): item
+                  for item in baseline.get('results', ())}
+        regressions = []
+        for result in results:
+            old = before.get((result['view'], result['user'],
+                              result['cache']))
+            if old is None:
+                continue
+            for metric in metrics:
+                was, now = old[metric], result[metric]
+                noise = NOISE_MS if metric.startswith('p') else 0
+                if now > was * (1 + threshold / 100) and now - was > noise:
+                    regressions.append(
+                        f'{result["view"]} ({result["user"]}, '
+                        f'{result["cache"]}): {metric} {was} -> {now}')
+        if regressions:
+            for line in regressions:
+                self.stderr.write(line)
+            raise CommandError(
+                f'Регрессий больше {threshold:g}%: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Регрессий больше {threshold:g}% нет'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import caching
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша страниц.'
+
+    def handle(self, *args, **options):
+        for name, stats in caching.stats().items():
+            self.stdout.write(
+                f'{name}: hits={stats["hits"]} misses={stats["misses"]} '
+                f'ratio={stats["ratio"]:.2%}')
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from posts import gc
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов и миниатюры, на которые больше '
+            'ничто не ссылается. Можно запускать под нагрузкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+        parser.add_argument('--min-age', type=float, default=3600,
+                            help='Не трогать файлы моложе стольких секунд.')
+        parser.add_argument('--rate', type=float, default=50,
+                            help='Сколько файлов удалять в секунду, '
+                                 '0 - без ограничения.')
+        parser.add_argument('--batch-size', type=int, default=gc.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            index = gc.LiveIndex(os.path.join(directory, 'live.sqlite3'))
+            try:
+                gc.build_index(index, options['batch_size'])
+                count, size = self.collect(index, options)
+            finally:
+                index.close()
+        verb = 'Лишних файлов' if options['dry_run'] else 'Удалено файлов'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: {count}, {size / 1024 / 1024:.1f} МБ'))
+
+    def collect(self, index, options):
+        limiter = gc.RateLimiter(options['rate'])
+        count = size = 0
+        for name, file_size in gc.orphans(index, options['min_age'],
+                                          options['batch_size']):
+            if options['verbosity'] > 1:
+                self.stdout.write(name)
+            if not options['dry_run']:
+                limiter.wait()
+                if not gc.delete(name, options['min_age']):
+                    continue
+            count += 1
+            size += file_size
+        return count, size
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+from posts.benchmark import BATCH_SIZE
+from posts.models import User
+from posts.synthetic import Generator
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу миллионами пользователей, сообществ, постов, '
+            'комментариев и подписок с правдоподобными распределениями, '
+            'см. posts/synthetic.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument('--follows', type=int, default=1000000,
+                            help='Примерное число подписок.')
+        parser.add_argument('--images', type=float, default=0.0,
+                            help='Доля постов с картинкой, от 0 до 1.')
+        parser.add_argument('--image-pool', type=int, default=50,
+                            help='Сколько разных картинок создать.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней до сегодня идут посты.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images - доля от 0 до 1.')
+        # Прошлый запуск могли прервать, пока триггер индекса был снят
+        if search.restore_index():
+            self.stdout.write('Триггер поискового индекса восстановлен, '
+                              'пропущенные посты проиндексированы.')
+        if User.objects.filter(
+                username__startswith=f'load{options["seed"]}_').exists():
+            raise CommandError(
+                f'Данные с seed {options["seed"]} уже созданы, '
+                f'укажите другой --seed.')
+        started = time.perf_counter()
+        generator = Generator(seed=options['seed'], days=options['days'],
+                              batch_size=options['batch_size'],
+                              stdout=self.stdout)
+        generator.generate(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], image_share=options['images'],
+            image_pool=options['image_pool'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.0f} с'))
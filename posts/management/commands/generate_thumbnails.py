@@ -0,0 +1,40 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import caching, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры для всех картинок постов в несколько '
+            'потоков, уже готовые пропускает, и заполняет размеры '
+            'картинок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Сколько картинок обрабатывать '
+                                 'одновременно.')
+
+    def handle(self, *args, **options):
+        rows = (Post.objects.exclude(image='')
+                .values_list('image', 'author__username', 'group__slug'))
+        images, scopes = set(), {'index'}
+        for image, username, slug in rows.iterator():
+            images.add(image)
+            scopes.add(f'profile:{username}')
+            if slug is not None:
+                scopes.add(f'group:{slug}')
+        images = sorted(images)
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            sizes = list(pool.map(thumbnails.generate, images))
+        done = 0
+        for image, size in zip(images, sizes):
+            if size is None:
+                continue
+            done += 1
+            thumbnails.store_size(image, size)
+        caching.bump(*scopes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы для {done} из {len(images)} картинок'))
@@ -0,0 +1,94 @@
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.benchmark import percentile
+from yatube import loadtest
+
+
+class Command(BaseCommand):
+    help = ('Нагружает yatube.wsgi.application внутри процесса смесью '
+            'сценариев или записанным журналом REQUEST_LOG и выводит '
+            'запросы в секунду, перцентили задержки и долю ошибок. '
+            'Отправки постов и комментариев пишут в базу по-настоящему.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Примерное число запросов смеси.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Сколько исполнителей шлют запросы.')
+        parser.add_argument('--processes', action='store_true',
+                            help='Исполнители - процессы, а не потоки.')
+        parser.add_argument('--replay', metavar='PATH',
+                            help='Воспроизвести журнал REQUEST_LOG '
+                                 'вместо смеси сценариев.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers должен быть не меньше 1.')
+        if options['replay']:
+            try:
+                with open(options['replay'], encoding='utf-8') as log:
+                    visits = loadtest.replay_steps(log)
+            except FileNotFoundError:
+                raise CommandError(f'Журнал {options["replay"]} не найден.')
+        else:
+            visits = loadtest.Mix(options['seed']).visits(
+                options['requests'])
+        if not visits:
+            raise CommandError(
+                'Нет запросов: журнал пуст или в базе нет постов и '
+                'подписок, см. generate_data.')
+        queues = loadtest.split(visits, options['workers'])
+        worker = partial(loadtest.run_worker,
+                         sessions=loadtest.sessions(visits))
+
+        if options['processes']:
+            # Дочерние процессы не должны делить соединения с родителем
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                len(queues), mp_context=multiprocessing.get_context('fork'))
+        else:
+            pool = ThreadPoolExecutor(len(queues))
+        started = time.perf_counter()
+        with pool:
+            results = [result for queue in pool.map(worker, queues)
+                       for result in queue]
+        self.report(results, time.perf_counter() - started, len(queues),
+                    'процессов' if options['processes'] else 'потоков')
+
+    def report(self, results, elapsed, workers, kind):
+        self.stdout.write(
+            f'{len(results)} запросов за {elapsed:.1f} с, {workers} '
+            f'{kind}: {len(results) / elapsed:.1f} запросов в секунду')
+        by_view = defaultdict(list)
+        for result in results:
+            by_view[result[0]].append(result)
+        self.stdout.write(
+            'view                  count   p50, ms   p95, ms   p99, ms'
+            '     4xx     5xx')
+        for view, items in sorted(by_view.items()) + [('всего', results)]:
+            self.write_row(view, items)
+        errors = sorted({error for _, _, _, error in results if error})
+        for error in errors[:10]:
+            self.stderr.write(error)
+
+    def write_row(self, view, items):
+        timings = [seconds * 1000 for _, _, seconds, _ in items]
+        client = sum(1 for _, status, _, _ in items
+                     if status is not None and 400 <= status < 500)
+        # Исключение внутри стека - тоже ошибка сервера
+        server = sum(1 for _, status, _, _ in items
+                     if status is None or status >= 500)
+        self.stdout.write(
+            f'{view:<20} {len(items):>6} '
+            f'{percentile(timings, 0.5):>9.2f} '
+            f'{percentile(timings, 0.95):>9.2f} '
+            f'{percentile(timings, 0.99):>9.2f} '
+            f'{client / len(items):>7.1%} {server / len(items):>7.1%}')
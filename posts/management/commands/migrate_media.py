@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import caching, media
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище с именами по '
+            'содержимому, одинаковые файлы склеиваются.')
+
+    def handle(self, *args, **options):
+        moved = missing = 0
+        for name in media.legacy_images():
+            if media.move(name) is None:
+                missing += 1
+                self.stderr.write(f'Нет файла {name}')
+            else:
+                moved += 1
+        if moved:
+            scopes = {'index'}
+            rows = Post.objects.exclude(image='').values_list(
+                'author__username', 'group__slug').distinct()
+            for username, slug in rows.iterator():
+                scopes.add(f'profile:{username}')
+                if slug is not None:
+                    scopes.add(f'group:{slug}')
+            caching.bump(*scopes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, не найдено: {missing}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики комментариев, записей и подписок '
+            'пачками строк.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=counters.BATCH_SIZE,
+                            help='Сколько строк обновлять за транзакцию.')
+
+    def handle(self, *args, **options):
+        counters.recount(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
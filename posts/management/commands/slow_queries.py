@@ -0,0 +1,73 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube import slowlog
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: самые затратные запросы '
+            'по суммарному времени, откуда они приходят и их планы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10,
+                            help='Сколько запросов показать.')
+        parser.add_argument('--log', default=None,
+                            help='Файл журнала, по умолчанию '
+                                 'SLOW_QUERY_LOG.')
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        try:
+            with open(path, encoding='utf-8') as log:
+                groups = self.aggregate(log)
+        except FileNotFoundError:
+            raise CommandError(f'Журнал {path} не найден.')
+        ranked = sorted(groups.values(), key=lambda group: group['total'],
+                        reverse=True)
+        self.stdout.write(f'Запросов в журнале: '
+                          f'{sum(group["count"] for group in ranked)}, '
+                          f'разных: {len(ranked)}')
+        for place, group in enumerate(ranked[:options['top']], 1):
+            self.write_group(place, group)
+
+    @staticmethod
+    def aggregate(lines):
+        groups = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0, 'sites': defaultdict(int),
+        })
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            group = groups[entry['fingerprint']]
+            group['count'] += 1
+            group['total'] += entry['seconds']
+            group['sites'][', '.join(
+                filter(None, (entry['view'], entry['template'],
+                              entry['code'])))] += 1
+            if entry['seconds'] >= group['max']:
+                group['max'] = entry['seconds']
+                group['slowest'] = entry
+        return groups
+
+    def write_group(self, place, group):
+        slowest = group['slowest']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{place}. {slowest["fingerprint"]}: '
+            f'всего {group["total"] * 1000:.1f} мс, '
+            f'вызовов {group["count"]}, '
+            f'в среднем {group["total"] / group["count"] * 1000:.1f} мс, '
+            f'максимум {group["max"] * 1000:.1f} мс'))
+        self.stdout.write(f'   {slowlog.normalize(slowest["sql"])}')
+        for site, count in sorted(group['sites'].items(),
+                                  key=lambda item: -item[1]):
+            self.stdout.write(f'   {count} x {site}')
+        if slowest['params'] is not None:
+            self.stdout.write(f'   параметры самого медленного: '
+                              f'{slowest["params"]}')
+        for row in slowest['plan'] or ():
+            self.stdout.write(f'   план: {row}')
@@ -0,0 +1,59 @@
+"""Учёт ссылок постов на файлы хранилища загрузок.
+
+Число ссылок меняется атомарным UPDATE с F-выражением, как счётчики
+в posts/counters.py. Команда migrate_media переносит старые файлы
+в хранилище с именами по содержимому.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import MediaBlob, Post
+from .storage import content_storage, is_hashed
+
+
+def retain(name, count=1):
+    """Добавляет файлу name count ссылок."""
+    if not name:
+        return
+    updated = MediaBlob.objects.filter(name=name).update(
+        refs=F('refs') + count)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, refs=count)
+    except IntegrityError:
+        MediaBlob.objects.filter(name=name).update(refs=F('refs') + count)
+
+
+def release(name, count=1):
+    """Снимает с файла name count ссылок, но не ниже нуля."""
+    if not name:
+        return
+    MediaBlob.objects.filter(name=name, refs__gte=count).update(
+        refs=F('refs') - count)
+
+
+def legacy_images():
+    """Имена картинок постов, сохранённые до хранилища по содержимому."""
+    names = (Post.objects.exclude(image='').exclude(image=None)
+             .values_list('image', flat=True).distinct().order_by('image'))
+    return [name for name in names if not is_hashed(name)]
+
+
+def move(name):
+    """Переносит файл name в хранилище по содержимому.
+
+    Возвращает новое имя или None, если файла нет. Старый файл
+    удаляется только после того, как посты переключены на новый.
+    """
+    if not content_storage.exists(name):
+        return None
+    with content_storage.open(name) as content:
+        new_name = content_storage.save(name, content)
+    with transaction.atomic():
+        moved = Post.objects.filter(image=name).update(image=new_name)
+        retain(new_name, moved)
+        release(name, moved)
+    content_storage.delete(name)
+    return new_name
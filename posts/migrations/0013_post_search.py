@@ -0,0 +1,99 @@
+from django.db import migrations
+
+# Полнотекстовый индекс постов в SQLite FTS5. Буква «ё» приводится к «е»,
+# остальную нормализацию регистра делает токенизатор unicode61, а
+# префиксные индексы ускоряют поиск по началу слова для русских окончаний.
+# SQL записан здесь, а не взят из posts.search: правки модуля не должны
+# менять то, что делает уже применённая миграция.
+FOLD = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+GROUP_TITLE = FOLD.format(
+    "coalesce((SELECT title FROM posts_group WHERE id = {}.group_id), '')")
+AUTHOR = FOLD.format(
+    "(SELECT username FROM auth_user WHERE id = {}.author_id)")
+
+CREATE_TABLE = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, group_title, author,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    """
+    INSERT INTO posts_post_fts (rowid, text, group_title, author)
+    SELECT id, {}, {}, {} FROM posts_post
+    """.format(FOLD.format('text'), GROUP_TITLE.format('posts_post'),
+               AUTHOR.format('posts_post')),
+]
+
+# SQLite удаляет триггеры вместе с таблицей, поэтому миграции, которые
+# пересоздают posts_post, должны снять их заранее и создать заново.
+TRIGGERS = [
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, group_title, author)
+        VALUES (new.id, {}, {}, {});
+    END
+    """.format(FOLD.format('new.text'), GROUP_TITLE.format('new'),
+               AUTHOR.format('new')),
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id, author_id ON posts_post BEGIN
+        UPDATE posts_post_fts
+        SET text = {}, group_title = {}, author = {}
+        WHERE rowid = new.id;
+    END
+    """.format(FOLD.format('new.text'), GROUP_TITLE.format('new'),
+               AUTHOR.format('new')),
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = {}
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """.format(FOLD.format('new.title')),
+    """
+    CREATE TRIGGER posts_user_fts_update
+    AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE posts_post_fts SET author = {}
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """.format(FOLD.format('new.username')),
+]
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS posts_user_fts_update',
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+]
+
+DROP_TABLE = ['DROP TABLE IF EXISTS posts_post_fts']
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_TABLE + TRIGGERS),
+                             run(DROP_TRIGGERS + DROP_TABLE)),
+    ]
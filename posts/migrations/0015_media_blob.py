@@ -0,0 +1,116 @@
+# Generated by Django 2.2.6 on 2026-10-18 04:46
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+# Триггеры индекса posts_post_fts, как их создаёт 0013. SQL записан
+# здесь, а не взят из другого модуля: миграция делает то же, что и в день
+# применения.
+TRIGGERS = [
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, group_title, author)
+        VALUES (
+            new.id,
+            replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'),
+            replace(replace(coalesce((SELECT title FROM posts_group
+                                      WHERE id = new.group_id), ''),
+                            'ё', 'е'), 'Ё', 'Е'),
+            replace(replace((SELECT username FROM auth_user
+                             WHERE id = new.author_id), 'ё', 'е'), 'Ё', 'Е')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id, author_id ON posts_post BEGIN
+        UPDATE posts_post_fts
+        SET text = replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'),
+            group_title = replace(replace(
+                coalesce((SELECT title FROM posts_group
+                          WHERE id = new.group_id), ''),
+                'ё', 'е'), 'Ё', 'Е'),
+            author = replace(replace(
+                (SELECT username FROM auth_user WHERE id = new.author_id),
+                'ё', 'е'), 'Ё', 'Е')
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts
+        SET group_title = replace(replace(new.title, 'ё', 'е'), 'Ё', 'Е')
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_user_fts_update
+    AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE posts_post_fts
+        SET author = replace(replace(new.username, 'ё', 'е'), 'Ё', 'Е')
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS posts_user_fts_update',
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+def count_refs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    counts = (Post.objects.exclude(image='').exclude(image=None).order_by()
+              .values_list('image').annotate(total=Count('pk')))
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refs=total) for name, total in counts],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+        ),
+        migrations.RunPython(count_refs, migrations.RunPython.noop),
+        # AlterField в SQLite пересоздаёт posts_post вместе с триггерами.
+        migrations.RunPython(run(DROP_TRIGGERS),
+                             run(TRIGGERS)),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Выберите файл изображения', null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+        migrations.RunPython(run(TRIGGERS),
+                             run(DROP_TRIGGERS)),
+    ]
@@ -0,0 +1,101 @@
+from django.db import migrations
+
+# Имя автора в индексе не приводилось к «е»: триггеры из 0013 исправлены,
+# а в уже созданных базах их нужно пересоздать и переписать столбец.
+# SQL записан здесь, а не взят из другого модуля: миграция делает то же,
+# что и в день применения.
+TRIGGERS = [
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, group_title, author)
+        VALUES (
+            new.id,
+            replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'),
+            replace(replace(coalesce((SELECT title FROM posts_group
+                                      WHERE id = new.group_id), ''),
+                            'ё', 'е'), 'Ё', 'Е'),
+            replace(replace((SELECT username FROM auth_user
+                             WHERE id = new.author_id), 'ё', 'е'), 'Ё', 'Е')
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id, author_id ON posts_post BEGIN
+        UPDATE posts_post_fts
+        SET text = replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'),
+            group_title = replace(replace(
+                coalesce((SELECT title FROM posts_group
+                          WHERE id = new.group_id), ''),
+                'ё', 'е'), 'Ё', 'Е'),
+            author = replace(replace(
+                (SELECT username FROM auth_user WHERE id = new.author_id),
+                'ё', 'е'), 'Ё', 'Е')
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts
+        SET group_title = replace(replace(new.title, 'ё', 'е'), 'Ё', 'Е')
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_user_fts_update
+    AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE posts_post_fts
+        SET author = replace(replace(new.username, 'ё', 'е'), 'Ё', 'Е')
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+]
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS posts_user_fts_update',
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+REFOLD = [
+    """
+    UPDATE posts_post_fts
+    SET author = (
+        SELECT replace(replace(
+            (SELECT username FROM auth_user
+             WHERE id = posts_post.author_id),
+            'ё', 'е'), 'Ё', 'Е')
+        FROM posts_post WHERE posts_post.id = posts_post_fts.rowid
+    )
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_media_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(DROP_TRIGGERS + TRIGGERS + REFOLD),
+                             migrations.RunPython.noop),
+    ]
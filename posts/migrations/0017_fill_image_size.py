@@ -0,0 +1,35 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.images import get_image_dimensions
+from django.db import migrations
+
+from posts.storage import content_storage
+
+
+def fill_image_size(apps, schema_editor):
+    # 0014 добавила размеры без значений, а без них для узкой картинки
+    # ожидается вариант, который никогда не будет создан.
+    Post = apps.get_model('posts', 'Post')
+    images = (Post.objects.filter(image_width=None).exclude(image='')
+              .exclude(image=None).order_by().values_list('image', flat=True)
+              .distinct())
+    for name in list(images.iterator()):
+        try:
+            with content_storage.open(name) as image:
+                width, height = get_image_dimensions(image)
+        except (OSError, ValueError, SuspiciousFileOperation):
+            continue
+        if width is None:
+            continue
+        Post.objects.filter(image=name, image_width=None).update(
+            image_width=width, image_height=height)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_fold_author'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_image_size, migrations.RunPython.noop),
+    ]
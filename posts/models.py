@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import content_storage
+
 User = get_user_model()
 
 
@@ -19,15 +21,34 @@ class Post(models.Model):
                               null=True, related_name="posts",
                               verbose_name='Сообщество',
                               help_text='Укажите сообщество')
-    image = models.ImageField(upload_to='posts/', blank=True, null=True,
+    image = models.ImageField(upload_to='posts/', storage=content_storage,
+                              blank=True, null=True,
                               verbose_name='Изображение',
                               help_text='Выберите файл изображения',)
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name='Ширина изображения')
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name='Высота изображения')
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число комментариев')
+    version = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Версия записи')
 
     def __str__(self):
         return self.text
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+        ]
 
 
 class Group(models.Model):
@@ -39,6 +60,8 @@ class Group(models.Model):
     description = models.TextField(verbose_name='Описание сообщества',
                                    help_text='Опишите для кого или для чего'
                                              ' ваше сообщество')
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число записей')
 
     def __str__(self):
         return self.title
@@ -66,6 +89,12 @@ class Comment(models.Model):
         verbose_name='Дата создания комментария',
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -88,3 +117,68 @@ class Follow(models.Model):
                 name='unique_follows',
             )
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляются на путях записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число записей',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписок',
+    )
+
+
+class FeedItem(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post', ],
+                name='unique_feed_items',
+            )
+        ]
+
+
+class MediaBlob(models.Model):
+    """Файл хранилища загрузок и число постов, которые на него ссылаются.
+
+    Файл без ссылок удаляет сборщик мусора, а не запрос: в это время
+    его может снова загрузить другой пользователь.
+    """
+    name = models.CharField(max_length=255, unique=True,
+                            verbose_name='Имя файла')
+    refs = models.PositiveIntegerField(default=0,
+                                       verbose_name='Число ссылок')
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,108 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+POSTS_PER_PAGE = 10
+
+
+def encode_cursor(post):
+    """Непрозрачный токен позиции поста в ленте: (pub_date, id)."""
+    raw = f'{post.pub_date.isoformat()}|{post.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def _evaluated(queryset, rows):
+    """QuerySet с уже загруженными строками: count() и итерация без SQL."""
+    queryset = queryset.none()
+    queryset._result_cache = rows
+    return queryset
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id) без OFFSET и COUNT(*).
+
+    Окно из per_page + 1 строк отдаётся стандартному Paginator,
+    поэтому шаблоны и код, ожидающие Page, работают как раньше.
+    К странице добавляются атрибуты next_cursor и previous_cursor.
+    """
+
+    def __init__(self, object_list, per_page=POSTS_PER_PAGE):
+        self.object_list = object_list
+        self.per_page = per_page
+
+    def get_page(self, after=None, before=None):
+        before_key = decode_cursor(before)
+        after_key = decode_cursor(after) if before_key is None else None
+        queryset = self.object_list
+
+        if before_key is not None:
+            pub_date, pk = before_key
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            ).order_by('pub_date', 'pk')
+        else:
+            if after_key is not None:
+                pub_date, pk = after_key
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, pk__lt=pk)
+                )
+            queryset = queryset.order_by('-pub_date', '-pk')
+
+        window = list(queryset[:self.per_page + 1])
+        has_more = len(window) > self.per_page
+        window = window[:self.per_page]
+        if before_key is not None:
+            window.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after_key is not None
+
+        paginator = Paginator(window, self.per_page)
+        page = paginator.get_page(1)
+        page.object_list = _evaluated(self.object_list, window)
+        page.next_cursor = (
+            encode_cursor(window[-1]) if has_next and window else None
+        )
+        page.previous_cursor = (
+            encode_cursor(window[0]) if has_previous and window else None
+        )
+        return paginator, page
+
+
+def paginate(request, object_list, per_page=POSTS_PER_PAGE):
+    """Возвращает (paginator, page) для ленты постов.
+
+    По умолчанию используется курсорная пагинация (?after=/?before=).
+    Нумерованные страницы включаются параметром ?page= или настройкой
+    POSTS_PAGINATION = 'numbered'.
+    """
+    mode = getattr(settings, 'POSTS_PAGINATION', 'cursor')
+    if mode == 'numbered' or 'page' in request.GET:
+        paginator = Paginator(object_list, per_page)
+        return paginator, paginator.get_page(request.GET.get('page'))
+    return CursorPaginator(object_list, per_page).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
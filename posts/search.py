@@ -0,0 +1,213 @@
+"""Полнотекстовый поиск постов по индексу SQLite FTS5.
+
+Индекс posts_post_fts и триггеры, которые поддерживают его
+в актуальном состоянии, создаёт миграция 0013_post_search. Здесь
+копия их SQL для кода, который снимает и возвращает триггер: миграции
+хранят свою и от этого модуля не зависят. Результаты ранжируются
+по bm25 и листаются курсором (rank, id).
+"""
+import base64
+import binascii
+import json
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+WORD = re.compile(r'\w+')
+# Вес совпадений в тексте, названии сообщества и имени автора.
+WEIGHTS = (1.0, 0.5, 0.5)
+
+# Буква «ё» приводится к «е», остальную нормализацию регистра делает
+# токенизатор unicode61, а префиксные индексы ускоряют поиск по началу
+# слова для русских окончаний.
+FOLD = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+GROUP_TITLE = FOLD.format(
+    "coalesce((SELECT title FROM posts_group WHERE id = {}.group_id), '')")
+AUTHOR = FOLD.format(
+    "(SELECT username FROM auth_user WHERE id = {}.author_id)")
+
+CREATE_TABLE = """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, group_title, author,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+"""
+
+# Индексирует посты, подходящие под условие {where}
+INDEX_POSTS = """
+    INSERT INTO posts_post_fts (rowid, text, group_title, author)
+    SELECT id, {}, {}, {} FROM posts_post
+    WHERE {{where}}
+""".format(FOLD.format('text'), GROUP_TITLE.format('posts_post'),
+           AUTHOR.format('posts_post'))
+
+INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, group_title, author)
+        VALUES (new.id, {}, {}, {});
+    END
+""".format(FOLD.format('new.text'), GROUP_TITLE.format('new'),
+           AUTHOR.format('new'))
+
+# SQLite удаляет триггеры вместе с таблицей, поэтому миграции, которые
+# пересоздают posts_post, должны снять их заранее и создать заново.
+TRIGGERS = [
+    INSERT_TRIGGER,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id, author_id ON posts_post BEGIN
+        UPDATE posts_post_fts
+        SET text = {}, group_title = {}, author = {}
+        WHERE rowid = new.id;
+    END
+    """.format(FOLD.format('new.text'), GROUP_TITLE.format('new'),
+               AUTHOR.format('new')),
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = {}
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """.format(FOLD.format('new.title')),
+    """
+    CREATE TRIGGER posts_user_fts_update
+    AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE posts_post_fts SET author = {}
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """.format(FOLD.format('new.username')),
+]
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS posts_user_fts_update',
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+]
+
+DROP_TABLE = ['DROP TABLE IF EXISTS posts_post_fts']
+
+
+def fold(text):
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def match_expression(query):
+    """Запрос FTS5 из слов пользователя: все слова, каждое как префикс.
+
+    Каждое слово берётся в кавычки, поэтому синтаксис FTS5 во вводе
+    пользователя не интерпретируется.
+    """
+    words = WORD.findall(fold(query))
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+@contextmanager
+def deferred_index():
+    """Снимает триггер индекса на время массовой вставки постов.
+
+    Посты, добавленные внутри блока, индексируются на выходе одним
+    INSERT ... SELECT, это вдвое быстрее построчного триггера. Если
+    процесс убит внутри блока, триггер вернёт restore_index().
+    """
+    if not is_available():
+        yield
+        return
+    last = Post.objects.order_by('-pk').values_list('pk', flat=True).first()
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TRIGGER IF EXISTS posts_post_fts_insert')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(INDEX_POSTS.format(where='id > %s'), [last or 0])
+            cursor.execute(INSERT_TRIGGER)
+
+
+def restore_index():
+    """Возвращает триггер, снятый deferred_index(), и индексирует посты,
+    которые остались без него. Возвращает True, если триггера не было.
+    """
+    if not is_available():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                       "AND name = 'posts_post_fts_insert'")
+        if cursor.fetchone():
+            return False
+        cursor.execute(INDEX_POSTS.format(
+            where='id NOT IN (SELECT rowid FROM posts_post_fts)'))
+        cursor.execute(INSERT_TRIGGER)
+    return True
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос, для фильтра pk__in."""
+    return RawSQL(
+        'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+        [match_expression(query)],
+    )
+
+
+def encode_cursor(rank, pk):
+    raw = json.dumps([rank, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rank, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rank), int(pk)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def search(query, after=None, per_page=10):
+    """Страница результатов поиска и курсор следующей страницы."""
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    if not is_available():
+        posts = Post.objects.select_related('author', 'group').filter(
+            text__icontains=query)
+        return list(posts[:per_page]), None
+    rank_sql = 'bm25(posts_post_fts, %s, %s, %s)' % WEIGHTS
+    sql = (f'SELECT rowid, {rank_sql} AS rank FROM posts_post_fts '
+           f'WHERE posts_post_fts MATCH %s')
+    params = [expression]
+    cursor_key = decode_cursor(after)
+    if cursor_key is not None:
+        sql += f' AND ({rank_sql}, rowid) > (%s, %s)'
+        params.extend(cursor_key)
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(per_page + 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    found = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, _ in rows])
+    posts = [found[pk] for pk, _ in rows if pk in found]
+    next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_next else None
+    return posts, next_cursor
@@ -0,0 +1,212 @@
+from django.core.files.images import get_image_dimensions
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, feed, media, thumbnails
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def prepare_post_update(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance.version += 1
+        instance._saved_group_id, instance._saved_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, None)
+        )
+
+
+@receiver(pre_save, sender=Post)
+def store_image_size(sender, instance, **kwargs):
+    image = instance.image
+    if not image:
+        instance.image_width = instance.image_height = None
+    elif not image._committed:
+        instance.image_width, instance.image_height = (
+            get_image_dimensions(image.file))
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change(UserStats, instance.author_id, 'posts_count', 1)
+        counters.change(Group, instance.group_id, 'posts_count', 1)
+        return
+    old_group_id = getattr(instance, '_saved_group_id', instance.group_id)
+    if old_group_id != instance.group_id:
+        counters.change(Group, old_group_id, 'posts_count', -1)
+        counters.change(Group, instance.group_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change(UserStats, instance.author_id, 'posts_count', -1)
+    counters.change(Group, instance.group_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(Post, instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change(Post, instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change(UserStats, instance.author_id, 'followers_count', 1)
+        counters.change(UserStats, instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change(UserStats, instance.author_id, 'followers_count', -1)
+    counters.change(UserStats, instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, **kwargs):
+    saved_image = None if created else getattr(instance, '_saved_image', None)
+    if instance.image.name != saved_image:
+        media.retain(instance.image.name)
+        media.release(saved_image)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_image_refs(sender, instance, **kwargs):
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def generate_thumbnails(sender, instance, **kwargs):
+    if not instance.image:
+        return
+    if instance.image.name != getattr(instance, '_saved_image', None):
+        transaction.on_commit(lambda: thumbnails.schedule(instance))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    if feed.dropped_below_limit(instance.author_id):
+        feed.backfill_followers(instance.author_id)
+
+
+def _post_scopes(post, *group_ids):
+    """Области кэша страниц, на которых показан пост."""
+    slugs = Group.objects.filter(
+        pk__in=[pk for pk in (post.group_id, *group_ids) if pk is not None]
+    ).values_list('slug', flat=True)
+    return ['index', f'profile:{post.author.username}',
+            *(f'group:{slug}' for slug in slugs)]
+
+
+@receiver(post_save, sender=Post)
+def expire_post_pages(sender, instance, **kwargs):
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    caching.bump(*_post_scopes(instance, saved_group_id))
+    feed.expire(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def expire_deleted_post_pages(sender, instance, **kwargs):
+    caching.bump(*_post_scopes(instance))
+    feed.expire(instance.author_id)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_name(sender, instance, **kwargs):
+    instance._saved_slug, instance._saved_title = (
+        instance.pk and Group.objects.filter(pk=instance.pk)
+        .values_list('slug', 'title').first() or (None, None)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def expire_group_pages(sender, instance, **kwargs):
+    scopes = ['index', f'group:{instance.slug}']
+    saved_slug = getattr(instance, '_saved_slug', None)
+    saved_title = getattr(instance, '_saved_title', None)
+    if saved_slug is not None and (saved_slug, saved_title) != (
+            instance.slug, instance.title):
+        # Название и ссылка на сообщество есть в карточках его постов
+        # и на профилях их авторов, а старый адрес должен дать 404.
+        authors = list(User.objects.filter(posts__group=instance).values_list(
+            'pk', 'username').distinct())
+        scopes.append(f'group:{saved_slug}')
+        scopes.extend(f'profile:{username}' for _, username in authors)
+        feed.expire(*(pk for pk, _ in authors))
+    caching.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_commented_post_pages(sender, instance, **kwargs):
+    caching.bump(*_post_scopes(instance.post))
+    feed.expire(instance.post.author_id)
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    # Вход сохраняет только last_login, лишний запрос ему не нужен.
+    if update_fields is not None and 'username' not in update_fields:
+        instance._saved_username = None
+        return
+    instance._saved_username = instance.pk and User.objects.filter(
+        pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def expire_new_user_pages(sender, instance, created, **kwargs):
+    # Имя могло принадлежать удалённому пользователю.
+    if created:
+        caching.bump(f'profile:{instance.username}')
+        return
+    saved = getattr(instance, '_saved_username', None)
+    if saved is None or saved == instance.username:
+        return
+    # Имя автора и ссылка на профиль есть во всех карточках его постов,
+    # а старый адрес профиля должен дать 404.
+    slugs = Group.objects.filter(posts__author=instance).values_list(
+        'slug', flat=True).distinct()
+    caching.bump('index', f'profile:{saved}',
+                 f'profile:{instance.username}',
+                 *(f'group:{slug}' for slug in slugs))
+    feed.expire(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def expire_deleted_user_pages(sender, instance, **kwargs):
+    caching.bump(f'profile:{instance.username}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follow_pages(sender, instance, **kwargs):
+    caching.bump(f'profile:{instance.author.username}',
+                 f'profile:{instance.user.username}',
+                 feed.scope(instance.user_id))
@@ -0,0 +1,101 @@
+"""Хранилище загрузок, которое называет файлы по содержимому.
+
+Имя файла - SHA-256 его содержимого, разложенный по вложенным
+каталогам внутри каталога upload_to: posts/ab/cd/abcd...ef.jpg. Файл,
+который уже есть в хранилище, повторно не записывается, и одинаковые
+картинки разных постов делят один файл. Сколько постов ссылается на
+файл, считает модель MediaBlob, см. posts/media.py.
+
+Файл пишется во временный рядом и появляется под своим именем жёсткой
+ссылкой: она создаётся атомарно и не заменяет существующий файл, поэтому
+две одновременные загрузки одной картинки получают одно имя.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """SHA-256 файла, читается кусками."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    directory = posixpath.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return posixpath.join(directory, digest[:2], digest[2:4],
+                          digest + extension)
+
+
+def is_hashed(name):
+    parts = name.split('/')
+    digest = os.path.splitext(parts[-1])[0]
+    return (len(parts) >= 3 and len(digest) == 64
+            and parts[-3:-1] == [digest[:2], digest[2:4]])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_hash(content))
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Сборщик мусора только что удалил файл: пишем заново
+                pass
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Занятое имя - тот же файл: суффикс сломал бы имя по содержимому
+        if is_hashed(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not is_hashed(name):
+            return super()._save(name, content)
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode,
+                            exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                for chunk in content.chunks():
+                    target.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            try:
+                os.link(temporary, full_path)
+            except FileExistsError:
+                # Такой же файл только что записала параллельная загрузка
+                os.utime(full_path)
+        finally:
+            os.unlink(temporary)
+        return name
+
+
+content_storage = ContentAddressedStorage()
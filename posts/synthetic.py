@@ -0,0 +1,270 @@
+"""Синтетическая база размером с рабочую для нагрузочных замеров.
+
+Распределения похожи на настоящие:
+- подписчики и число постов по степенному закону: немногие авторы
+  собирают почти все подписки, немногие пишут большую часть постов;
+- посты идут всплесками: активные периоды сменяются затишьем,
+  а во всплеске автор часто пишет несколько постов подряд;
+- у сообществ длинный хвост, часть постов без сообщества;
+- комментарии достаются в основном популярным постам, вскоре после
+  публикации;
+- картинки по желанию берутся из небольшого набора файлов, как
+  повторные загрузки одного и того же.
+
+Строки вставляются пачками прямыми INSERT в транзакциях, как в
+posts/benchmark.py, сигналы не срабатывают. Поэтому в конце
+пересчитываются счётчики, ссылки на файлы и ленты подписок. С одним
+и тем же seed получаются те же тексты и связи, а даты отсчитываются
+от момента запуска.
+"""
+import io
+import math
+import random
+from collections import Counter
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.utils import timezone
+from PIL import Image
+
+from . import counters, feed, media, search
+from .benchmark import BATCH_SIZE, _insert
+from .models import Comment, Follow, Group, Post, User
+from .storage import content_storage
+
+# Показатель степенного закона популярности авторов, сообществ и постов
+ZIPF_EXPONENT = 1.1
+# Доля постов без сообщества
+NO_GROUP_SHARE = 0.3
+# Переходы между всплеском и затишьем после каждого поста
+BURST_END = 0.1
+BURST_START = 0.3
+# Средний интервал между постами в затишье относительно всплеска
+QUIET_GAP = 20
+# Вероятность, что во всплеске пишет тот же автор
+SAME_AUTHOR = 0.6
+# Медиана числа слов в посте и среднее время до комментария в часах
+TEXT_WORDS = 30
+COMMENT_DELAY_HOURS = 6
+
+WORDS = (
+    'кот', 'дом', 'город', 'утро', 'вечер', 'дорога', 'река', 'книга',
+    'друг', 'работа', 'погода', 'музыка', 'фото', 'поезд', 'море', 'лес',
+    'новый', 'старый', 'быстро', 'сегодня', 'вчера', 'снова', 'очень',
+    'красивый', 'смотреть', 'читать', 'писать', 'думать', 'идти', 'и',
+    'в', 'на', 'с', 'не', 'что', 'как', 'это', 'мы', 'они', 'был',
+)
+
+
+def zipf_weights(count, exponent=ZIPF_EXPONENT):
+    """Накопленные веса рангов 1..count для random.choices."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+class Generator:
+    def __init__(self, seed=0, days=365, batch_size=BATCH_SIZE,
+                 stdout=None):
+        self.seed = seed
+        self.rnd = random.Random(seed)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.adapt = connection.ops.adapt_datetimefield_value
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def insert(self, model, columns, rows):
+        """Вставляет строки из итератора пачками по batch_size."""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                _insert(model._meta.db_table, columns, batch)
+                batch = []
+        if batch:
+            _insert(model._meta.db_table, columns, batch)
+
+    def new_pks(self, model, after):
+        return list(model.objects.filter(pk__gt=after).order_by('pk')
+                    .values_list('pk', flat=True))
+
+    def last_pk(self, model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+
+    def text(self, median=TEXT_WORDS):
+        words = max(1, int(self.rnd.lognormvariate(math.log(median), 0.8)))
+        return ' '.join(self.rnd.choices(WORDS, k=words)).capitalize()
+
+    def generate(self, users, groups, posts, comments, follows,
+                 image_share=0.0, image_pool=50):
+        self.make_users(users)
+        self.make_groups(groups)
+        self.make_posts(posts, image_share, image_pool)
+        self.make_comments(comments)
+        self.make_follows(follows)
+        self.log('Пересчитываю счётчики, ссылки на файлы и ленты...')
+        counters.recount()
+        for name, refs in self.image_refs.items():
+            media.retain(name, refs)
+        feed.rebuild()
+
+    def make_users(self, count):
+        self.log(f'Создаю {count} пользователей...')
+        after = self.last_pk(User)
+        span = (self.now - self.start).total_seconds()
+        self.insert(
+            User,
+            ('username', 'password', 'is_superuser', 'is_staff',
+             'is_active', 'first_name', 'last_name', 'email',
+             'date_joined'),
+            ((f'load{self.seed}_{i}', '!', False, False, True, '', '', '',
+              self.adapt(self.start + timedelta(
+                  seconds=self.rnd.uniform(0, span))))
+             for i in range(count)))
+        self.users = self.new_pks(User, after)
+        # Ранги популярности и активности независимы: иначе самые
+        # читаемые авторы пишут больше всех и ленты раздуваются
+        self.popular = self.users[:]
+        self.rnd.shuffle(self.popular)
+        self.active = self.users[:]
+        self.rnd.shuffle(self.active)
+        self.user_weights = zipf_weights(len(self.users))
+
+    def make_groups(self, count):
+        self.log(f'Создаю {count} сообществ...')
+        after = self.last_pk(Group)
+        self.insert(
+            Group, ('title', 'slug', 'description', 'posts_count'),
+            ((f'Сообщество {i}', f'load{self.seed}-{i}',
+              self.text(median=12), 0)
+             for i in range(count)))
+        self.groups = self.new_pks(Group, after)
+        self.group_weights = zipf_weights(len(self.groups))
+
+    def make_images(self, count):
+        """Небольшой набор картинок: пары (имя, ширина, высота)."""
+        images = []
+        for i in range(count):
+            width = self.rnd.randrange(640, 2560, 16)
+            height = int(width * self.rnd.choice((0.5, 0.5625, 0.75, 1.0)))
+            color = tuple(self.rnd.randrange(256) for _ in range(3))
+            content = io.BytesIO()
+            Image.new('RGB', (width, height), color).save(
+                content, 'JPEG', quality=85)
+            name = content_storage.save(f'posts/load{self.seed}_{i}.jpg',
+                                        ContentFile(content.getvalue()))
+            images.append((name, width, height))
+        return images
+
+    def timeline(self, count):
+        """Моменты публикации со всплесками и флаги «во всплеске»."""
+        moments, bursts = [], []
+        moment, burst = 0.0, True
+        for _ in range(count):
+            mean_gap = 1 if burst else QUIET_GAP
+            moment += self.rnd.expovariate(1 / mean_gap)
+            moments.append(moment)
+            bursts.append(burst)
+            switch = BURST_END if burst else BURST_START
+            if self.rnd.random() < switch:
+                burst = not burst
+        span = (self.now - self.start).total_seconds()
+        scale = span / moment if moments else 0
+        return [self.start + timedelta(seconds=value * scale)
+                for value in moments], bursts
+
+    def make_posts(self, count, image_share, image_pool):
+        self.log(f'Создаю {count} постов...')
+        images = self.make_images(image_pool) if image_share else []
+        image_weights = zipf_weights(len(images))
+        self.image_refs = Counter()
+        moments, bursts = self.timeline(count)
+        after = self.last_pk(Post)
+
+        def rows():
+            author = None
+            for moment, burst in zip(moments, bursts):
+                if author is None or not (
+                        burst and self.rnd.random() < SAME_AUTHOR):
+                    author = self.rnd.choices(
+                        self.active, cum_weights=self.user_weights)[0]
+                group = None
+                if self.groups and self.rnd.random() >= NO_GROUP_SHARE:
+                    group = self.rnd.choices(
+                        self.groups, cum_weights=self.group_weights)[0]
+                image, width, height = '', None, None
+                if images and self.rnd.random() < image_share:
+                    image, width, height = self.rnd.choices(
+                        images, cum_weights=image_weights)[0]
+                    self.image_refs[image] += 1
+                yield (self.text(), self.adapt(moment), author, group,
+                       image, width, height, 0, 0)
+
+        with search.deferred_index():
+            self.insert(Post, ('text', 'pub_date', 'author_id', 'group_id',
+                               'image', 'image_width', 'image_height',
+                               'comments_count', 'version'), rows())
+        self.posts = list(zip(self.new_pks(Post, after), moments))
+
+    def make_comments(self, count):
+        if not self.posts:
+            return
+        self.log(f'Создаю {count} комментариев...')
+        popular = self.posts[:]
+        self.rnd.shuffle(popular)
+        weights = zipf_weights(len(popular))
+        delay = COMMENT_DELAY_HOURS * 3600
+
+        def rows():
+            for _ in range(count):
+                post, published = self.rnd.choices(
+                    popular, cum_weights=weights)[0]
+                created = min(self.now, published + timedelta(
+                    seconds=self.rnd.expovariate(1 / delay)))
+                yield (self.text(median=10), self.adapt(created), post,
+                       self.rnd.choice(self.users))
+
+        self.insert(Comment, ('text', 'created', 'post_id', 'author_id'),
+                    rows())
+
+    def make_follows(self, count):
+        """Подписки: число авторов у читателя случайное, авторы - по рангу."""
+        if len(self.users) < 2:
+            return
+        self.log(f'Создаю около {count} подписок...')
+        mean = count / len(self.users)
+
+        def rows():
+            for user in self.users:
+                wanted = min(len(self.users) - 1, int(
+                    self.rnd.expovariate(1 / mean) + 0.5) if mean else 0)
+                authors = set(self.rnd.choices(
+                    self.popular, cum_weights=self.user_weights, k=wanted))
+                authors.discard(user)
+                for author in sorted(authors):
+                    yield user, author
+
+        self.insert(Follow, ('user_id', 'author_id'), rows())
+
+
+def ensure(posts, seed=0, stdout=None):
+    """Досоздаёт данные до posts постов в пропорциях generate_data.
+
+    seed берётся первый свободный, начиная с заданного, чтобы
+    повторные вызовы не упирались в уже созданных пользователей.
+    """
+    missing = posts - Post.objects.count()
+    if missing <= 0:
+        return
+    while User.objects.filter(username__startswith=f'load{seed}_').exists():
+        seed += 1
+    Generator(seed=seed, stdout=stdout).generate(
+        users=max(2, missing // 10), groups=max(1, missing // 1000),
+        posts=missing, comments=missing * 2, follows=missing)
@@ -0,0 +1,13 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Варианты картинки карточки поста или None, пока их готовят."""
+    if not post.image:
+        return None
+    return thumbnails.ready(post)
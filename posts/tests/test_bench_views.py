@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+from contextlib import closing
+from io import StringIO
+from sqlite3 import connect
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from posts.benchmark import percentile
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class PercentileTest(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1), 100)
+        self.assertEqual(percentile([7], 0.95), 7)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+
+class ScratchDatabaseTest(TestCase):
+    def test_benchmarks_leave_database_alone(self):
+        """Наполнение для замеров идёт в отдельную базу, а не в рабочую."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'bench.sqlite3')
+        call_command('bench_pagination', '--posts=30', '--pages=1,2',
+                     '--repeat=1', f'--database={path}', stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 0)
+        self.assertEqual(User.objects.count(), 0)
+        with closing(connect(path)) as scratch:
+            self.assertEqual(scratch.execute(
+                'SELECT count(*) FROM posts_post').fetchone()[0], 30)
+        call_command('bench_indexes', '--users=5', '--groups=1',
+                     '--posts=20', '--comments=10', '--follows=5',
+                     '--repeat=1', stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 0)
+        index_names = {index.name for index in Post._meta.indexes}
+        with connection.cursor() as cursor:
+            self.assertLessEqual(index_names, set(
+                connection.introspection.get_constraints(
+                    cursor, Post._meta.db_table)))
+
+
+class BenchViewsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.baseline = os.path.join(directory, 'baseline.json')
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(text='Пост читателя', author=reader)
+        post = Post.objects.create(text='Пост автора', author=author,
+                                   group=group)
+        Comment.objects.create(text='Комментарий', post=post, author=reader)
+        Follow.objects.create(user=reader, author=author)
+
+    def bench(self, *args):
+        call_command('bench_views', '--posts=0', '--repeat=2', *args,
+                     stdout=StringIO(), stderr=StringIO())
+
+    def test_baseline(self):
+        """Эталон содержит все страницы в четырёх режимах, записи откачены."""
+        self.bench(f'--save={self.baseline}')
+        with open(self.baseline, encoding='utf-8') as source:
+            results = json.load(source)['results']
+        seen = {(item['view'], item['user'], item['cache'])
+                for item in results}
+        self.assertIn(('index', 'anon', 'cold'), seen)
+        self.assertIn(('follow_index', 'user', 'warm'), seen)
+        self.assertIn(('add_comment POST', 'user', 'cold'), seen)
+        self.assertNotIn(('follow_index', 'anon', 'cold'), seen)
+        for item in results:
+            self.assertLess(item['status'], 500, item)
+            self.assertLessEqual(item['p50'], item['p99'])
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_compare(self):
+        self.bench(f'--save={self.baseline}')
+        with open(self.baseline, encoding='utf-8') as source:
+            report = json.load(source)
+        self.bench(f'--compare={self.baseline}', '--threshold=1000',
+                   '--metrics=queries')
+        for item in report['results']:
+            item['queries'] = 0
+        with open(self.baseline, 'w', encoding='utf-8') as target:
+            json.dump(report, target)
+        with self.assertRaises(CommandError):
+            self.bench(f'--compare={self.baseline}', '--metrics=queries')
+
+    def test_unknown_metric(self):
+        with self.assertRaises(CommandError):
+            self.bench('--metrics=p42')
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from yatube.cache import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Значение, записанное одним процессом, видно другому."""
+        self.cache.set('key', {'value': 1})
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), {'value': 1})
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_values_are_missing(self):
+        """Просроченный ключ не возвращается и не мешает add()."""
+        self.cache.set('key', 'old', timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr_and_get_many(self):
+        """incr атомарен в транзакции, get_many читает пачкой."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertEqual(self.cache.get_many(['counter', 'missing']),
+                         {'counter': 3})
+
+    def test_least_recently_used_keys_are_culled(self):
+        """Сверх MAX_ENTRIES вытесняются давно не читанные ключи."""
+        cache = self.make_cache(MAX_ENTRIES=5, CULL_FREQUENCY=5)
+        for i in range(5):
+            cache.set(f'key{i}', i)
+        cache._connection().execute(
+            'UPDATE cache SET accessed = 0 WHERE key = ?',
+            (cache.make_key('key0'),))
+        cache.set('key5', 5)
+        cache._cull()
+        self.assertIsNone(cache.get('key0'))
+        self.assertEqual(cache.get('key5'), 5)
+
+    def test_get_or_set_recomputes_once_and_serves_stale(self):
+        """Пока один воркер пересчитывает ключ, другие получают старое."""
+        self.cache.set('page', 'stale', timeout=-1)
+        started = threading.Event()
+        calls = []
+
+        def slow_render():
+            calls.append(1)
+            started.set()
+            time.sleep(0.3)
+            return 'fresh'
+
+        worker = threading.Thread(
+            target=self.cache.get_or_set, args=('page', slow_render))
+        worker.start()
+        started.wait()
+        self.assertEqual(self.make_cache().get_or_set('page', slow_render),
+                         'stale')
+        worker.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.get('page'), 'fresh')
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase
+
+
+class SQLitePragmasTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_connection(self):
+        """Новое соединение получает PRAGMA из настроек базы."""
+        pragmas = settings.DATABASES['default']['PRAGMAS']
+        for name in ('busy_timeout', 'cache_size'):
+            with self.subTest(name=name):
+                self.assertEqual(self.pragma(name), pragmas[name])
+
+    def test_unsafe_pragma_is_rejected(self):
+        """Значение PRAGMA не может содержать произвольный SQL."""
+        params = connection.get_connection_params()
+        pragmas = connection.settings_dict['PRAGMAS']
+        connection.settings_dict['PRAGMAS'] = {'cache_size': '1; DROP'}
+        try:
+            with self.assertRaises(ImproperlyConfigured):
+                connection.get_new_connection(params)
+        finally:
+            connection.settings_dict['PRAGMAS'] = pragmas
@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import feed
+from posts.models import FeedItem, Follow, Post, User
+
+
+class FollowFeedTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.old_post = Post.objects.create(text='Старый пост',
+                                            author=self.author)
+
+    def feed_posts(self):
+        return set(feed.follow_feed(self.reader))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет старые посты автора, отписка убирает."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_posts(), {self.old_post})
+
+        follow.delete()
+        self.assertEqual(self.feed_posts(), set())
+        self.assertFalse(FeedItem.objects.exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост раскладывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.reader, post=new_post).exists())
+        self.assertEqual(self.feed_posts(), {self.old_post, new_post})
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_popular_author_is_pulled_on_read(self):
+        """Посты популярного автора не раскладываются, а читаются."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(FeedItem.objects.exists())
+        self.assertEqual(self.feed_posts(), {self.old_post, new_post})
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=2)
+    def test_author_below_limit_is_backfilled(self):
+        """Посты автора, опустившегося ниже порога, раскладываются разом."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        other = User.objects.create_user(username='other')
+        follow = Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(FeedItem.objects.filter(post=new_post).exists())
+        # Отписка, удаление из ленты и один INSERT ... SELECT для всех
+        with self.assertNumQueries(7):
+            follow.delete()
+        self.assertEqual(set(FeedItem.objects.values_list(
+            'user__username', 'post')), {('reader', self.old_post.pk),
+                                         ('reader', new_post.pk)})
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_pulled_author_expires_feed_etag(self):
+        """Пост популярного автора сбрасывает ETag ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        url = reverse('follow_index')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rebuild_command(self):
+        """Команда rebuild_feeds восстанавливает ленты из подписок."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedItem.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.feed_posts(), {self.old_post})
@@ -1,6 +1,11 @@
+import io
+import shutil
+import tempfile
+
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import Post
 from posts.models import Group, User, Comment
@@ -144,3 +149,62 @@ class PostFormTests(TestCase):
                                      kwargs={'username': self.user.username,
                                              'post_id': self.test_post.id}))
         self.assertEqual(self.test_post.text, form_data['text'])
+
+
+class ImageUploadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user')
+        self.client.force_login(self.user)
+        media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+    @staticmethod
+    def jpeg(size=(300, 200), orientation=6):
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        content = io.BytesIO()
+        Image.new('RGB', size, (10, 120, 200)).save(content, 'JPEG',
+                                                    exif=exif)
+        return SimpleUploadedFile('photo.jpg', content.getvalue(),
+                                  content_type='image/jpeg')
+
+    def post(self, image):
+        return self.client.post(reverse('new_post'),
+                                {'text': 'Пост с фото', 'image': image})
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=100)
+    def test_image_is_reencoded_without_exif(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF."""
+        self.post(self.jpeg())
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (67, 100))
+            self.assertNotIn(0x0112, image.getexif())
+        self.assertEqual((post.image_width, post.image_height), (67, 100))
+
+    @override_settings(POSTS_UPLOAD_MAX_BYTES=100)
+    def test_large_upload_is_rejected(self):
+        """Файл больше предела отбрасывается с понятной ошибкой."""
+        response = self.post(self.jpeg())
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_are_rejected(self):
+        """Слишком большую по пикселям картинку не декодируют."""
+        response = self.post(self.jpeg())
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка слишком большая: 300x200 пикселей.')
+
+    def test_unsupported_format_is_rejected(self):
+        """Картинки в форматах не из списка не принимаются."""
+        content = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(content, 'BMP')
+        image = SimpleUploadedFile('image.bmp', content.getvalue(),
+                                   content_type='image/bmp')
+        response = self.post(image)
+        self.assertFormError(response, 'form', 'image',
+                             'Поддерживаются только JPEG, PNG, GIF и WebP.')
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, User
+from yatube import loadtest
+from yatube.wsgi import application
+
+
+class RequestLogTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.log = os.path.join(directory, 'requests.jsonl')
+        self.user = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+
+    def test_capture_and_replay(self):
+        """Журнал без токенов CSRF воспроизводится с новыми токенами."""
+        self.client.force_login(self.user)
+        url = reverse('add_comment', args=['reader', self.post.pk])
+        with override_settings(REQUEST_LOG=self.log):
+            self.client.get(reverse('index'))
+            self.client.post(url, {'text': 'Комментарий',
+                                   'csrfmiddlewaretoken': 'secret'})
+        with open(self.log, encoding='utf-8') as log:
+            entries = [json.loads(line) for line in log]
+        self.assertEqual([entry['view'] for entry in entries],
+                         ['index', 'add_comment'])
+        self.assertEqual(entries[1]['data'], {'text': 'Комментарий'})
+        self.assertEqual(entries[1]['user'], self.user.pk)
+
+        with open(self.log, encoding='utf-8') as log:
+            visits = loadtest.replay_steps(log)
+        self.assertEqual(len(visits), 1)
+        session_key = loadtest.login(self.user.pk)
+        visitor = loadtest.VirtualUser(application, session_key)
+        for step in visits[0]:
+            visitor.request(step['method'], step['path'], step['data'])
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_log_is_off_by_default(self):
+        self.client.get(reverse('index'))
+        self.assertFalse(os.path.exists(self.log))
+
+
+class VirtualUserTest(TestCase):
+    def test_form_submission(self):
+        """Токен CSRF берётся из формы, настоящая проверка CSRF проходит."""
+        user = User.objects.create_user(username='author')
+        visitor = loadtest.VirtualUser(application, loadtest.login(user.pk))
+        self.assertEqual(visitor.request('GET', reverse('new_post')), 200)
+        self.assertIsNotNone(visitor.csrf_token)
+        self.assertEqual(visitor.request('POST', reverse('new_post'),
+                                         {'text': 'Нагрузка'}), 302)
+        self.assertTrue(Post.objects.filter(text='Нагрузка').exists())
+
+    def test_feed_follows_cursor(self):
+        """Листание ленты идёт по курсору ?after= из ответа."""
+        author = User.objects.create_user(username='author')
+        for number in range(25):
+            Post.objects.create(text=f'Пост {number}', author=author)
+        first = loadtest.Mix.step('index', reverse('index'), None)
+        # Третья страница последняя, четвёртый шаг пропускается
+        steps = [first] + [dict(first, next=True)] * 3
+        spy = mock.patch.object(loadtest.VirtualUser, 'request',
+                                autospec=True,
+                                side_effect=loadtest.VirtualUser.request)
+        with spy as request:
+            results = loadtest.run_worker(steps)
+        paths = [call[0][2] for call in request.call_args_list]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(paths[0], reverse('index'))
+        self.assertTrue(all('?after=' in path for path in paths[1:]))
+        self.assertTrue(all(status == 200 for _, status, _, _ in results))
+
+    def test_post_without_token(self):
+        visitor = loadtest.VirtualUser(application)
+        self.assertEqual(visitor.request('POST', reverse('login'), {
+            'username': 'nobody', 'password': 'wrong'}), 200)
+
+
+class SplitTest(SimpleTestCase):
+    def test_visits_are_not_broken(self):
+        visits = [[{'n': 1}, {'n': 2}], [{'n': 3}], [{'n': 4}, {'n': 5}]]
+        self.assertEqual(loadtest.split(visits, 2),
+                         [[{'n': 1}, {'n': 2}, {'n': 4}, {'n': 5}],
+                          [{'n': 3}]])
+        self.assertEqual(len(loadtest.split(visits, 10)), 3)
+
+
+class LoadTestCommandTest(TestCase):
+    def test_mix(self):
+        """Смесь сценариев ходит по страницам и отправляет формы."""
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=author)
+        Follow.objects.create(user=reader, author=author)
+        visits = loadtest.Mix(seed=1).visits(200)
+        views = {step['view'] for visit in visits for step in visit}
+        self.assertLessEqual({'index', 'post', 'add_comment', 'new_post'},
+                             views)
+        self.assertTrue(all(step['user'] == reader.pk
+                            for visit in visits for step in visit
+                            if step['method'] == 'POST'))
+
+    def test_no_data(self):
+        with self.assertRaises(CommandError):
+            call_command('load_test', stdout=StringIO())
+
+
+class LoadTestRunTest(TransactionTestCase):
+    def test_threads(self):
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=author)
+        Follow.objects.create(user=reader, author=author)
+        output = StringIO()
+        spy = mock.patch.object(loadtest, 'login', wraps=loadtest.login)
+        with spy as login:
+            call_command('load_test', '--requests=30', '--workers=2',
+                         stdout=output, stderr=StringIO())
+        # Сессия создаётся один раз до запуска потоков, а не в каждом
+        login.assert_called_once_with(reader.pk)
+        report = output.getvalue()
+        self.assertIn('запросов в секунду', report)
+        # Потоки делят базу в памяти и могут упираться в блокировки,
+        # поэтому проверяется отчёт, а не отсутствие ошибок
+        self.assertRegex(report, r'всего\s+\d+ ')
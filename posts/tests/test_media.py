@@ -0,0 +1,187 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import gc, thumbnails
+from posts.models import MediaBlob, Post, User
+from posts.storage import content_storage, is_hashed
+
+
+def png(color=(200, 30, 30)):
+    content = io.BytesIO()
+    Image.new('RGB', (20, 20), color).save(content, 'png')
+    return content.getvalue()
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.author = User.objects.create_user(username='author')
+
+    def create_post(self, content, name='image.png'):
+        return Post.objects.create(
+            text='Пост', author=self.author,
+            image=SimpleUploadedFile(name, content, 'image/png'))
+
+    def refs(self, name):
+        return MediaBlob.objects.get(name=name).refs
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые картинки ложатся в один файл по хешу содержимого."""
+        first = self.create_post(png(), 'first.PNG')
+        second = self.create_post(png(), 'second.png')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed(first.image.name))
+        self.assertRegex(first.image.name,
+                         r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.png$')
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    def test_same_content_refreshes_mtime(self):
+        """Повторная загрузка освежает файл, сборщик мусора его не тронет."""
+        name = self.create_post(png()).image.name
+        os.utime(content_storage.path(name), (0, 0))
+        self.create_post(png(), name='again.png')
+        self.assertGreater(os.path.getmtime(content_storage.path(name)), 0)
+
+    def test_concurrent_uploads_share_name(self):
+        """Загрузка, которая разминулась с такой же, получает то же имя."""
+        name = self.create_post(png()).image.name
+        os.utime(content_storage.path(name), (0, 0))
+        # Проверка exists() прошла до того, как первая загрузка записала файл
+        with mock.patch.object(content_storage, 'exists', return_value=False):
+            again = self.create_post(png(), name='again.png')
+        self.assertEqual(again.image.name, name)
+        self.assertEqual(self.refs(name), 2)
+        self.assertGreater(os.path.getmtime(content_storage.path(name)), 0)
+        directory = os.path.dirname(content_storage.path(name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
+
+    def test_refs_follow_edits_and_deletes(self):
+        """Ссылки снимаются при замене картинки и удалении поста."""
+        post = self.create_post(png())
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('new.png', png((0, 0, 0)))
+        post.save()
+        self.assertEqual(self.refs(old_name), 0)
+        self.assertEqual(self.refs(post.image.name), 1)
+        post.delete()
+        self.assertEqual(self.refs(post.image.name), 0)
+
+    def test_migrate_media_moves_legacy_files(self):
+        """Команда переносит старые файлы и склеивает одинаковые."""
+        for name in ('posts/old.png', 'posts/copy.png'):
+            content_storage._save(name, ContentFile(png()))
+            Post.objects.create(text=name, author=self.author, image=name)
+
+        call_command('migrate_media', stdout=io.StringIO())
+
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_hashed(name))
+        self.assertTrue(content_storage.exists(name))
+        self.assertFalse(content_storage.exists('posts/old.png'))
+        self.assertEqual(self.refs(name), 2)
+        self.assertEqual(self.refs('posts/old.png'), 0)
+
+
+class GarbageCollectorTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        author = User.objects.create_user(username='author')
+        self.live = Post.objects.create(
+            text='Живой', author=author,
+            image=SimpleUploadedFile('live.png', png(), 'image/png'))
+        self.dead = Post.objects.create(
+            text='Удалённый', author=author,
+            image=SimpleUploadedFile('dead.png', png((0, 0, 0)),
+                                     'image/png'))
+        for post in (self.live, self.dead):
+            thumbnails.generate(post.image.name)
+        self.dead.delete()
+
+    def gc(self, *args):
+        output = io.StringIO()
+        call_command('gc_media', '--min-age=0', '--rate=0', *args,
+                     stdout=output)
+        return output.getvalue()
+
+    def files(self, post):
+        return [post.image.name] + [
+            thumbnails.backend.variant_file(post.image, variant).name
+            for variant in thumbnails.variants(post.image_width)]
+
+    def test_dry_run_only_reports(self):
+        """Пробный запуск показывает лишние файлы и ничего не удаляет."""
+        output = self.gc('--dry-run', '--verbosity=2')
+        for name in self.files(self.dead):
+            self.assertIn(name, output)
+            self.assertTrue(content_storage.exists(name))
+        for name in self.files(self.live):
+            self.assertNotIn(name, output)
+        self.assertIn(f'Лишних файлов: {len(self.files(self.dead))}',
+                      output)
+
+    def test_orphans_are_deleted(self):
+        """Удаляются только файлы, на которые не ссылается ни один пост."""
+        self.gc('--batch-size=2')
+        for name in self.files(self.dead):
+            self.assertFalse(content_storage.exists(name))
+        for name in self.files(self.live):
+            self.assertTrue(content_storage.exists(name))
+        self.assertFalse(
+            MediaBlob.objects.filter(name=self.dead.image.name).exists())
+
+    def test_recent_files_are_kept(self):
+        """Свежие файлы могли только что загрузить, их не трогают."""
+        call_command('gc_media', stdout=io.StringIO())
+        for name in self.files(self.dead):
+            self.assertTrue(content_storage.exists(name))
+
+    def test_reupload_during_collection_is_kept(self):
+        """Файл, загруженный заново во время обхода, не удаляется."""
+        names = self.files(self.dead)
+        for name in names:
+            os.utime(content_storage.path(name), (0, 0))
+        with tempfile.TemporaryDirectory() as directory:
+            index = gc.LiveIndex(os.path.join(directory, 'live.sqlite3'))
+            gc.build_index(index)
+            found = [name for name, _ in gc.orphans(index, min_age=60)]
+            index.close()
+        self.assertEqual(sorted(found), sorted(names))
+
+        again = Post.objects.create(
+            text='Снова', author=self.live.author,
+            image=SimpleUploadedFile('again.png', png((0, 0, 0)),
+                                     'image/png'))
+        thumbnails.generate(again.image.name)
+        for name in found:
+            self.assertFalse(gc.delete(name, min_age=60), name)
+            self.assertTrue(content_storage.exists(name))
+
+    def test_deleted_thumbnails_are_forgotten(self):
+        """После удаления миниатюр процессы забывают их адреса."""
+        files = list(thumbnails._post_files(self.dead).values())
+        thumbnails._lookup(files)
+        self.assertIsNotNone(thumbnails._recall(files[0].key))
+        # Как будто сборщик мусора работал в другом процессе
+        thumbnails.caching.bump(thumbnails.GENERATION_SCOPE)
+        thumbnails._checked_at = None
+        thumbnails._lookup([])
+        self.assertIsNone(thumbnails._recall(files[0].key))
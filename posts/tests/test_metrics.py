@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import metrics
+
+
+def _increment(times):
+    for _ in range(times):
+        metrics.DB_QUERIES.inc(view='worker')
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        directory = override_settings(METRICS_DIR=self.directory)
+        directory.enable()
+        self.addCleanup(directory.disable)
+
+    def test_segments_are_summed(self):
+        """Значения файлов разных процессов складываются."""
+        first = metrics.Segment(os.path.join(self.directory, '1.db'))
+        second = metrics.Segment(os.path.join(self.directory, '2.db'))
+        first.add([('a{}', 1), ('b{}', 0.5)])
+        second.add([('a{}', 2)])
+        # Файл растёт, если ключи не помещаются
+        second.add([(f'key{i}{{}}', i) for i in range(5000)])
+        self.assertEqual(metrics.collect()['a{}'], 3)
+        self.assertEqual(metrics.collect()['key4999{}'], 4999)
+        first.close()
+        # Перезапуск процесса продолжает свой файл
+        reopened = metrics.Segment(os.path.join(self.directory, '1.db'))
+        reopened.add([('a{}', 1)])
+        self.assertEqual(metrics.collect()['a{}'], 4)
+        reopened.close()
+        second.close()
+
+    def test_worker_processes_share_metrics(self):
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_increment, args=(10,))
+                   for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        _increment(1)
+        totals = metrics.collect()
+        self.assertEqual(totals['yatube_db_queries_total{view="worker"}'],
+                         31)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_exposition(self):
+        """Запрос страницы виден в гистограмме, счётчиках базы и кэша."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=author)
+        self.client.get(reverse('index'))
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE yatube_view_duration_seconds histogram', text)
+        self.assertIn('yatube_view_duration_seconds_bucket'
+                      '{view="index",method="GET",le="+Inf"} 1', text)
+        self.assertIn('yatube_view_duration_seconds_count'
+                      '{view="index",method="GET"} 1', text)
+        self.assertIn('yatube_view_responses_total'
+                      '{view="index",status="200"} 1', text)
+        self.assertRegex(text, r'yatube_db_queries_total\{view="index"\} '
+                               r'[1-9]')
+        self.assertIn('yatube_cache_requests_total'
+                      '{family="page",result="miss"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Тест.',
+                                      buckets=(0.1, 1))
+        self.addCleanup(metrics.registry.remove, histogram)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        lines = histogram.exposition(metrics.collect())
+        self.assertEqual(lines[2:], [
+            'test_seconds_bucket{le="0.1"} 0',
+            'test_seconds_bucket{le="1"} 1',
+            'test_seconds_bucket{le="+Inf"} 2',
+            'test_seconds_count 2',
+            'test_seconds_sum 5.5',
+        ])
+
+    def test_access(self):
+        """Страница доступна сотрудникам и разрешённым адресам."""
+        url = reverse('metrics')
+        # За прокси все клиенты приходят с 127.0.0.1
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.2']):
+            self.assertEqual(self.client.get(
+                url, REMOTE_ADDR='10.0.0.2').status_code, 200)
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 403)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
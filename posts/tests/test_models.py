@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Post, Group
+from posts.models import Comment, Follow, Group, Post, UserStats
 
 
 class GroupModelTest(TestCase):
@@ -102,3 +105,54 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_object_name = post.text
         self.assertEqual(expected_object_name, str(post))
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.other_group = Group.objects.create(title='Другая', slug='other',
+                                                description='Описание')
+        self.post = Post.objects.create(text='Текст', author=self.author,
+                                        group=self.group)
+
+    def counters(self):
+        self.post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        author = UserStats.objects.get(user=self.author)
+        reader = UserStats.objects.get(user=self.reader)
+        return (self.post.comments_count, self.group.posts_count,
+                self.other_group.posts_count, author.posts_count,
+                author.followers_count, reader.following_count)
+
+    def test_write_paths_keep_counters_exact(self):
+        """Счётчики меняются при создании, правке и удалении."""
+        self.assertEqual(self.counters(), (0, 1, 0, 1, 0, 0))
+
+        comment = Comment.objects.create(post=self.post, author=self.reader,
+                                         text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(), (1, 1, 0, 1, 1, 1))
+
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertEqual(self.counters(), (1, 0, 1, 1, 1, 1))
+
+        comment.delete()
+        follow.delete()
+        self.assertEqual(self.counters(), (0, 0, 1, 1, 0, 0))
+
+    def test_recount_command_repairs_counters(self):
+        """Команда recount_counters восстанавливает счётчики."""
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        Post.objects.update(comments_count=7)
+        Group.objects.update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+
+        call_command('recount_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 1, 0, 1, 0, 0))
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.utils import QueryBudgetMixin
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(text='Пост', author=self.author,
+                                        group=self.group)
+        self.add_posts(1)
+        cache.clear()
+
+    def add_posts(self, count):
+        posts = []
+        for i in range(count):
+            author = User.objects.create_user(
+                username=f'writer_{Post.objects.count()}')
+            posts.append(Post.objects.create(text=str(i), author=author,
+                                             group=self.group))
+            posts.append(Post.objects.create(text=str(i),
+                                             author=self.author))
+        Comment.objects.create(post=posts[0], author=self.reader, text='-')
+        return posts
+
+    def grow_feed(self):
+        self.add_posts(5)
+        cache.clear()
+
+    def grow_comments(self):
+        for i in range(5):
+            author = User.objects.create_user(username=f'commenter_{i}')
+            Comment.objects.create(post=self.post, author=author, text=str(i))
+        cache.clear()
+
+    def test_feeds_query_count_does_not_depend_on_page_size(self):
+        """Ленты делают одинаковое число запросов на 1 и 10 записей."""
+        urls = (
+            reverse('index'),
+            reverse('group', args=[self.group.slug]),
+            reverse('profile', args=[self.author.username]),
+            reverse('follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.client, url, self.grow_feed,
+                                       budget=8)
+
+    def test_post_query_count_does_not_depend_on_comments(self):
+        """Страница поста не делает запрос на каждый комментарий."""
+        url = reverse('post', args=[self.author.username, self.post.id])
+        self.assertQueryBudget(self.client, url, self.grow_comments,
+                               budget=8)
@@ -0,0 +1,103 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post, User
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='ежевика')
+        self.group = Group.objects.create(title='Лесные жители',
+                                          slug='forest', description='-')
+        self.hedgehog = Post.objects.create(
+            text='Ёжик вышел из тумана', author=self.author)
+        self.owl = Post.objects.create(
+            text='Сова не спит', author=self.author, group=self.group)
+        self.other = Post.objects.create(
+            text='Про погоду', author=User.objects.create_user('kot'))
+
+    def found(self, query, **kwargs):
+        return search.search(query, **kwargs)[0]
+
+    def test_prefix_and_yo_folding(self):
+        """Поиск по началу слова и без разницы между «е» и «ё»."""
+        self.assertEqual(self.found('ежики'), [])
+        self.assertEqual(self.found('ежик'), [self.hedgehog])
+        self.assertEqual(self.found('ТУМАН'), [self.hedgehog])
+
+    def test_group_title_and_author_are_indexed(self):
+        """Находятся посты по названию сообщества и имени автора."""
+        self.assertEqual(self.found('лесные'), [self.owl])
+        self.assertEqual(set(self.found('ежевика')),
+                         {self.hedgehog, self.owl})
+
+    def test_author_rename_is_folded(self):
+        """Имя автора с «ё» находится и после переименования."""
+        self.author.username = 'ёлка'
+        self.author.save()
+        self.assertEqual(set(self.found('елка')), {self.hedgehog, self.owl})
+        user = User.objects.create_user(username='ёжик')
+        post = Post.objects.create(text='Новый пост', author=user)
+        self.assertEqual(self.found('новый ежик'), [post])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Триггеры обновляют индекс при правке и удалении поста."""
+        self.owl.text = 'Филин не спит'
+        self.owl.save()
+        self.assertEqual(self.found('филин'), [self.owl])
+        self.owl.delete()
+        self.assertEqual(self.found('филин'), [])
+
+    def test_interrupted_deferred_index_is_restored(self):
+        """Триггер, снятый прерванной массовой вставкой, возвращается."""
+        self.assertFalse(search.restore_index())
+        with self.assertRaises(KeyboardInterrupt):
+            with search.deferred_index():
+                Post.objects.create(text='Барсук', author=self.author)
+                raise KeyboardInterrupt
+        self.assertEqual(len(self.found('барсук')), 1)
+        # Процесс убит без finally: триггера нет, пост не в индексе
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        badger = Post.objects.create(text='Барсук спит', author=self.author)
+        self.assertEqual(len(self.found('барсук')), 1)
+        call_command('generate_data', '--users=1', '--groups=0',
+                     '--posts=0', '--comments=0', '--follows=0',
+                     stdout=StringIO())
+        self.assertIn(badger, self.found('барсук'))
+        Post.objects.create(text='Барсук проснулся', author=self.author)
+        self.assertEqual(len(self.found('барсук')), 3)
+
+    def test_fts_syntax_is_not_interpreted(self):
+        """Операторы FTS5 во вводе пользователя не ломают запрос."""
+        self.assertEqual(self.found('ежик OR "NEAR(*'), [])
+
+    def test_keyset_pages(self):
+        """Курсор ведёт на следующую страницу без повторов."""
+        first, cursor = search.search('ежевика', per_page=1)
+        second, last_cursor = search.search('ежевика', after=cursor,
+                                            per_page=1)
+        self.assertEqual(len(first), 1)
+        self.assertIsNone(last_cursor)
+        self.assertEqual(set(first + second), {self.hedgehog, self.owl})
+
+    def test_search_page(self):
+        """Страница поиска доступна гостям и показывает результаты."""
+        response = Client().get(reverse('search'), {'q': 'сова'})
+        self.assertEqual(list(response.context['posts']), [self.owl])
+        self.assertContains(response, 'Сова не спит')
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через FTS5."""
+        admin = site._registry[Post]
+        request = RequestFactory().get('/')
+        queryset, use_distinct = admin.get_search_results(
+            request, Post.objects.all(), 'туман')
+        self.assertEqual(list(queryset), [self.hedgehog])
+        self.assertIn('posts_post_fts', str(queryset.query))
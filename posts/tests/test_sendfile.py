@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+CONTENT = bytes(range(256)) * 40
+
+
+class MediaServingTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        os.makedirs(os.path.join(media_root, 'posts'))
+        with open(os.path.join(media_root, 'posts', 'image.png'), 'wb') as f:
+            f.write(CONTENT)
+        self.url = '/media/posts/image.png'
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_file_is_served_with_cache_headers(self):
+        """Файл отдаётся целиком с заголовками для долгого кэширования."""
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_conditional_get(self):
+        """По совпавшему ETag возвращается 304 без тела."""
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_byte_ranges(self):
+        """Запросы Range получают нужный кусок файла."""
+        size = len(CONTENT)
+        for header, start, end in (('bytes=10-19', 10, 19),
+                                   ('bytes=10000-', 10000, size - 1),
+                                   ('bytes=-6', size - 6, size - 1),
+                                   ('bytes=10200-20000', 10200, size - 1)):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'],
+                                 f'bytes {start}-{end}/{size}')
+                self.assertEqual(response['Content-Length'],
+                                 str(end - start + 1))
+                self.assertEqual(b''.join(response.streaming_content),
+                                 CONTENT[start:end + 1])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'],
+                         f'bytes */{len(CONTENT)}')
+
+    def test_stale_if_range_gets_whole_file(self):
+        """Если файл изменился, вместо куска отдаётся весь файл."""
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        """Для nginx отдаётся только заголовок с внутренним адресом."""
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/internal/media/posts/image.png')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @override_settings(SENDFILE_BACKEND='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.get()
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(settings.MEDIA_ROOT, 'posts', 'image.png'))
+        self.assertEqual(response.content, b'')
+
+    def test_missing_and_outside_files(self):
+        for url in ('/media/posts/missing.png', '/media/posts'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.get('/media/%2e%2e/yatube/settings.py')
+        self.assertEqual(response.status_code, 400)
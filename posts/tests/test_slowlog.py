@@ -0,0 +1,83 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import slowlog
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.log = os.path.join(directory, 'slow.jsonl')
+        # Порог 0: в журнал попадает каждый запрос
+        log = override_settings(SLOW_QUERY_SECONDS=0, SLOW_QUERY_LOG=self.log)
+        log.enable()
+        self.addCleanup(log.disable)
+        quiet = mock.patch.object(slowlog.logger, 'disabled', True)
+        quiet.start()
+        self.addCleanup(quiet.stop)
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=self.author)
+
+    def entries(self):
+        with open(self.log, encoding='utf-8') as log:
+            return [json.loads(line) for line in log]
+
+    def test_normalize(self):
+        """Значения и длина списков IN не меняют отпечаток запроса."""
+        self.assertEqual(
+            slowlog.normalize("SELECT *  FROM t WHERE a = 'x''y' "
+                              "AND b IN (%s, %s, %s) LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?')
+        self.assertEqual(
+            slowlog.fingerprint('SELECT a FROM t WHERE id IN (%s, %s)'),
+            slowlog.fingerprint('SELECT a FROM t WHERE id IN (%s, %s, %s)'))
+
+    def test_request_queries_are_logged(self):
+        """Запись журнала знает представление, место в коде и план."""
+        self.client.get(reverse('profile', args=[self.author.username]))
+        entries = [entry for entry in self.entries()
+                   if entry['view'] == 'profile']
+        self.assertTrue(entries)
+        select = next(entry for entry in entries
+                      if 'FROM "posts_post"' in entry['sql'])
+        self.assertRegex(select['fingerprint'], r'^[0-9a-f]{12}$')
+        self.assertTrue(select['plan'])
+        self.assertIsNotNone(select['params'])
+        self.assertTrue(all(entry['code'] for entry in entries))
+
+    def test_template_line(self):
+        """Запрос из шаблона помечается именем шаблона и строкой."""
+        Template('{% for user in users %}{{ user }}{% endfor %}').render(
+            Context({'users': User.objects.all()}))
+        self.assertIn('<unknown source>:1', [entry['template']
+                                             for entry in self.entries()])
+
+    def test_report(self):
+        for _ in range(3):
+            Post.objects.filter(text='Пост').count()
+        output = io.StringIO()
+        call_command('slow_queries', '--top=1', stdout=output)
+        report = output.getvalue()
+        self.assertIn('1. ', report)
+        self.assertNotIn('\n2. ', report)
+        self.assertIn('Запросов в журнале', report)
+        self.assertIn('posts/tests/test_slowlog.py', report)
+
+
+class IsolatedLogTest(TestCase):
+    def test_test_run_keeps_repository_log(self):
+        """Прогон тестов пишет журнал во временный каталог, а не в logs/."""
+        self.assertFalse(settings.SLOW_QUERY_LOG.startswith(
+            os.path.join(settings.BASE_DIR, '')))
@@ -0,0 +1,101 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from yatube import staticfiles
+
+CSS = b'body { background: url("../img/dot.png"); }\n' * 50
+
+
+class StaticPipelineTest(SimpleTestCase):
+    def setUp(self):
+        source = tempfile.mkdtemp()
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        for name, content in (('css/site.css', CSS),
+                              ('img/dot.png', b'\x89PNG\r\n\x1a\n')):
+            os.makedirs(os.path.join(source, os.path.dirname(name)),
+                        exist_ok=True)
+            with open(os.path.join(source, name), 'wb') as file:
+                file.write(content)
+        static = override_settings(STATIC_ROOT=static_root,
+                                   STATICFILES_DIRS=[source])
+        static.enable()
+        self.addCleanup(static.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.css = staticfiles_storage.stored_name('css/site.css')
+
+    def get(self, name, **headers):
+        response = self.client.get(settings.STATIC_URL + name, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        """Сборка кладёт файлы с хешем в имени и их сжатые копии."""
+        self.assertRegex(self.css, r'^css/site\.\w{12}\.css$')
+        self.assertTrue(staticfiles_storage.exists(self.css + '.gz'))
+        with staticfiles_storage.open(self.css + '.gz') as compressed:
+            content = gzip.decompress(compressed.read())
+        with staticfiles_storage.open(self.css) as original:
+            self.assertEqual(content, original.read())
+        self.assertIn(b'dot.', content)
+        # PNG не сжимается повторно
+        png = staticfiles_storage.stored_name('img/dot.png')
+        self.assertFalse(staticfiles_storage.exists(png + '.gz'))
+
+    def test_template_links_hashed_names(self):
+        html = Template("{% load static %}{% static 'css/site.css' %}"
+                        ).render(Context())
+        self.assertEqual(html, settings.STATIC_URL + self.css)
+
+    def test_hashed_file_is_immutable(self):
+        """Файл с хешем отдаётся сжатым и кэшируется навсегда."""
+        response = self.get(self.css, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        content = gzip.decompress(b''.join(response.streaming_content))
+        with staticfiles_storage.open(self.css) as original:
+            self.assertEqual(content, original.read())
+
+    def test_identity_encoding(self):
+        for header in ('', 'gzip;q=0, identity'):
+            with self.subTest(header=header):
+                response = self.get(self.css, HTTP_ACCEPT_ENCODING=header)
+                self.assertNotIn('Content-Encoding', response)
+                with staticfiles_storage.open(self.css) as original:
+                    self.assertEqual(b''.join(response.streaming_content),
+                                     original.read())
+
+    @unittest.skipIf(staticfiles.brotli is None, 'brotli не установлен')
+    def test_brotli_is_preferred(self):
+        response = self.get(self.css, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_unhashed_file_is_cached_briefly(self):
+        response = self.get('css/site.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    def test_conditional_get(self):
+        etag = self.get(self.css)['ETag']
+        response = self.get(self.css, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(
+            staticfiles.accepted_encodings('gzip;q=0.5, BR, deflate;q=0'),
+            {'gzip', 'br'})
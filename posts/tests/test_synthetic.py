@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models import Count, F
+from django.test import TestCase, override_settings
+
+from posts import search
+from posts.models import (Comment, FeedItem, Follow, Group, MediaBlob, Post,
+                          User, UserStats)
+from posts.synthetic import Generator
+from yatube import slowlog
+
+
+class GenerateDataTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        quiet = mock.patch.object(slowlog.logger, 'disabled', True)
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+    def generate(self, *args):
+        call_command('generate_data', '--users=50', '--groups=5',
+                     '--posts=300', '--comments=400', '--follows=200',
+                     *args, stdout=StringIO())
+
+    def test_counts_and_counters(self):
+        """Строки созданы, счётчики, ссылки на файлы и ленты согласованы."""
+        self.generate('--images=0.2', '--image-pool=2')
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 400)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        for post in Post.objects.annotate(total=Count('comments')):
+            self.assertEqual(post.comments_count, post.total)
+        for stats in UserStats.objects.all():
+            self.assertEqual(stats.posts_count, Post.objects.filter(
+                author_id=stats.user_id).count())
+            self.assertEqual(stats.followers_count, Follow.objects.filter(
+                author_id=stats.user_id).count())
+        with_images = Post.objects.exclude(image='').count()
+        self.assertTrue(with_images)
+        self.assertEqual(
+            sum(MediaBlob.objects.values_list('refs', flat=True)),
+            with_images)
+        self.assertTrue(FeedItem.objects.exists())
+
+    def test_search_index(self):
+        """Посты попадают в поисковый индекс, триггер восстановлен."""
+        self.generate()
+        if not search.is_available():
+            return
+        self.assertTrue(Post.objects.filter(
+            pk__in=search.matching_ids('кот')).exists())
+        author = User.objects.first()
+        post = Post.objects.create(text='Уникальноеслово', author=author)
+        self.assertTrue(Post.objects.filter(
+            pk=post.pk,
+            pk__in=search.matching_ids('уникальноеслово')).exists())
+
+    def test_same_seed_same_data(self):
+        def snapshot(seed):
+            with transaction.atomic():
+                Generator(seed=seed).generate(
+                    users=20, groups=3, posts=100, comments=50, follows=40)
+                data = list(Post.objects.order_by('pk').values_list(
+                    'text', 'author__username', 'group__slug'))
+                transaction.set_rollback(True)
+            return data
+
+        self.assertEqual(snapshot(1), snapshot(1))
+        self.assertNotEqual(snapshot(1), snapshot(2))
+
+    def test_seed_is_not_reused(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
@@ -0,0 +1,186 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+
+from posts import caching, thumbnails
+from posts.kvstore import KVStore
+from posts.models import Post, User
+
+
+def image_file(name='image.png', size=(1200, 800)):
+    content = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(content, 'png')
+    return SimpleUploadedFile(name, content.getvalue(),
+                              content_type='image/png')
+
+
+class MediaRootMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        cache.clear()
+        thumbnails.forget()
+
+
+class ThumbnailsTest(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(
+            text='Пост с картинкой', author=self.author, image=image_file())
+        cache.clear()
+
+    def thumbnail_file(self, variant=thumbnails.FALLBACK):
+        return thumbnails.backend.variant_file(self.post.image, variant)
+
+    def test_card_shows_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюру готовят в фоне, на странице заглушка."""
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, 'class="card-img" src=')
+        self.assertContains(response, 'card-img bg-light')
+
+        thumbnails.wait()
+        response = self.client.get(reverse('index'))
+        self.assertContains(
+            response, f'class="card-img" src="{self.thumbnail_file().url}"')
+
+    def test_thumbnail_name_matches_sorl(self):
+        """Имя миниатюры считается так же, как в sorl-thumbnail."""
+        variant = thumbnails.FALLBACK
+        self.assertEqual(thumbnails.generate(self.post.image.name),
+                         (1200, 800))
+        thumbnail = get_thumbnail(self.post.image, variant.geometry,
+                                  **variant.options)
+        self.assertEqual(self.thumbnail_file().name, thumbnail.name)
+        self.assertEqual(tuple(thumbnail.size), (960, 339))
+
+    def test_image_size_is_stored(self):
+        """Размеры картинки сохраняются в посте при загрузке."""
+        self.assertEqual((self.post.image_width, self.post.image_height),
+                         (1200, 800))
+        self.post.image = None
+        self.post.save()
+        self.assertIsNone(self.post.image_width)
+
+    def test_card_has_responsive_variants(self):
+        """Карточка предлагает браузеру несколько ширин и форматов."""
+        thumbnails.generate(self.post.image.name)
+        response = self.client.get(reverse('index'))
+        webp = thumbnails.Variant('WEBP', 480)
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f'{self.thumbnail_file(webp).url} 480w')
+        self.assertContains(response, f'{self.thumbnail_file().url} 960w')
+        self.assertNotContains(response, '1440w')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_variants_follow_image_width(self):
+        """Варианты шире оригинала, кроме основного, не готовятся."""
+        widths = {variant.width for variant in thumbnails.variants(500)}
+        self.assertEqual(widths, {480, 960})
+        widths = {variant.width for variant in thumbnails.variants(None)}
+        self.assertEqual(widths, set(thumbnails.WIDTHS))
+
+    def test_existing_thumbnails_do_not_expire_pages(self):
+        """Повторная подготовка без новых файлов не сбрасывает страницы."""
+        thumbnails.generate(self.post.image.name)
+        generation = caching.generations(['index'])
+        thumbnails._generate_pending(self.post.image.name, ['index'])
+        self.assertEqual(caching.generations(['index']), generation)
+
+    def test_missing_source_is_skipped(self):
+        """Картинку, которой нет в хранилище, не обрабатывают."""
+        self.assertIsNone(thumbnails.generate('posts/missing.png'))
+        self.assertIsNone(thumbnails.generate('/tmp/outside.png'))
+
+    def test_generate_thumbnails_command(self):
+        """Команда готовит миниатюры для уже загруженных картинок."""
+        output = io.StringIO()
+        call_command('generate_thumbnails', workers=2, stdout=output)
+        self.assertIn('1 из 1', output.getvalue())
+        self.assertTrue(default.storage.exists(self.thumbnail_file().name))
+        self.assertIsNotNone(thumbnails.ready(self.post))
+
+    def test_page_thumbnails_are_read_in_one_batch(self):
+        """Миниатюры страницы читаются из хранилища одним запросом."""
+        for number in range(3):
+            Post.objects.create(text=f'Ещё пост {number}', author=self.author,
+                                image=image_file(f'image{number}.png'))
+        call_command('generate_thumbnails', stdout=io.StringIO())
+        thumbnails.forget()
+
+        get_raw = mock.patch.object(KVStore, '_get_raw', autospec=True,
+                                    side_effect=KVStore._get_raw)
+        get_many = mock.patch.object(KVStore, 'get_many', autospec=True,
+                                     side_effect=KVStore.get_many)
+        with get_raw as single, get_many as batch:
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'class="card-img" src=', count=4)
+        self.assertEqual(batch.call_count, 1)
+        self.assertEqual(single.call_count, 0)
+
+    def test_search_thumbnails_are_read_in_one_batch(self):
+        """Карточки результатов поиска тоже читают миниатюры разом."""
+        for number in range(2):
+            # Разное содержимое, иначе хранилище сведёт их в один файл
+            Post.objects.create(
+                text=f'Пост {number}', author=self.author,
+                image=image_file(f'image{number}.png', (1000 + number, 800)))
+        call_command('generate_thumbnails', stdout=io.StringIO())
+        thumbnails.forget()
+
+        get_many = mock.patch.object(KVStore, 'get_many', autospec=True,
+                                     side_effect=KVStore.get_many)
+        with get_many as batch:
+            response = self.client.get(reverse('search'), {'q': 'пост'})
+        self.assertContains(response, 'class="card-img" src=', count=3)
+        self.assertEqual(batch.call_count, 1)
+
+    @override_settings(THUMBNAIL_LRU_SIZE=2)
+    def test_recent_thumbnails_are_bounded(self):
+        """В памяти остаются только недавно показанные миниатюры."""
+        files = [thumbnails.backend.thumbnail_file(f'posts/{name}.png', '10')
+                 for name in 'abc']
+        thumbnails._remember(files[:2])
+        thumbnails._recall(files[0].key)
+        thumbnails._remember(files[2:])
+        self.assertIsNotNone(thumbnails._recall(files[0].key))
+        self.assertIsNone(thumbnails._recall(files[1].key))
+        self.assertIsNotNone(thumbnails._recall(files[2].key))
+
+
+class ImageSizeTest(MediaRootMixin, TransactionTestCase):
+    # Размеры пишет фоновый поток, ему нужна зафиксированная запись
+    def test_narrow_image_without_size_settles(self):
+        """Узкая картинка без размеров готовится один раз, а не на
+        каждом показе, и кэш страниц перестаёт сбрасываться."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(text='Узкая', author=author,
+                                   image=image_file('narrow.png', (800, 600)))
+        thumbnails.wait()
+        # Пост загружен до миграции 0014: размеры неизвестны
+        Post.objects.filter(pk=post.pk).update(image_width=None,
+                                               image_height=None)
+        self.client.get(reverse('index'))
+        thumbnails.wait()
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (800, 600))
+        self.client.get(reverse('index'))
+        thumbnails.wait()
+        generation = caching.generations(['index'])
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            self.client.get(reverse('index'))
+            self.client.get(reverse('index'))
+        schedule.assert_not_called()
+        self.assertEqual(caching.generations(['index']), generation)
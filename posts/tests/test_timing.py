@@ -0,0 +1,62 @@
+import re
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube import timing
+
+
+class ServerTimingTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=author)
+        cache.clear()
+
+    def metrics(self, response):
+        return {item.split(';')[0].strip(): item
+                for item in response['Server-Timing'].split(',')}
+
+    def test_phases_in_header(self):
+        """В Server-Timing есть SQL, шаблоны, кэш, миниатюры и общее время."""
+        metrics = self.metrics(self.client.get(reverse('index')))
+        self.assertEqual(set(metrics),
+                         {'sql', 'tpl', 'cache', 'thumb', 'total'})
+        self.assertRegex(metrics['sql'], r'dur=[\d.]+;desc="SQL count=\d+"')
+        self.assertIn('misses=', metrics['cache'])
+        # Второй запрос берёт страницу из кэша и не рисует шаблон
+        metrics = self.metrics(self.client.get(reverse('index')))
+        self.assertNotIn('tpl', metrics)
+        self.assertRegex(metrics['cache'], r'hits=[1-9]')
+
+    def test_log_line(self):
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            self.client.get(reverse('index'))
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertTrue(record.getMessage().startswith('GET / 200 '))
+        self.assertGreater(record.timings['sql_count'], 0)
+        self.assertIn('total', record.timings)
+
+    def test_profile_only_for_staff(self):
+        """?profile=1 отдаёт сводку cProfile только сотрудникам."""
+        url = reverse('index') + '?profile=1'
+        user = User.objects.create_user(username='user')
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertIn('page', response.context)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+        self.assertTrue(re.search(r'\d+ function calls',
+                                  response.content.decode()))
+        self.assertIn('Server-Timing', response)
+
+    def test_recording_outside_requests_is_noop(self):
+        with timing.phase('thumb'):
+            timing.record('sql', 1.0, sql_count=1)
+        self.assertIsNone(timing.current())
@@ -1,13 +1,16 @@
 import os
 import tempfile
 import shutil
-from django.core.cache import cache
+from unittest import mock
+
+from django.core.cache import cache, caches
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 
+from posts import caching, thumbnails
 from posts.models import Group, Post, User, Comment, Follow
 
 
@@ -17,6 +20,7 @@ class ViewPageContextTest(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         os.mkdir(f'{settings.BASE_DIR}/tmp/')
+        cls.media_root = settings.MEDIA_ROOT
         settings.MEDIA_ROOT = tempfile.mkdtemp(dir=f'{settings.BASE_DIR}/tmp/')
 
     def setUp(self):
@@ -62,9 +66,13 @@ class ViewPageContextTest(TestCase):
             image=self.uploaded,
         )
         cache.clear()
+        # Иначе фоновый пул сбросит страницы с постом посреди теста.
+        thumbnails.generate(self.test_post.image.name)
 
     @classmethod
     def tearDownClass(cls):
+        thumbnails.wait()
+        settings.MEDIA_ROOT = cls.media_root
         shutil.rmtree(f'{settings.BASE_DIR}/tmp/', ignore_errors=True)
         super().tearDownClass()
 
@@ -141,24 +149,203 @@ class ViewPageContextTest(TestCase):
                 self.assertEqual(actual, expected, msg)
 
     def test_cache(self):
-        """Главная страница корректно кэширует список записей."""
+        """Главная страница кэшируется и сбрасывается при правке записи."""
 
         response_before = self.user_one_client.get(reverse('index'))
         page_before_clear_cache = response_before.content
 
         post = Post.objects.latest('id')
-        post.text = 'Кэш ' + post.text
-        post.save()
+        Post.objects.filter(pk=post.pk).update(text='Кэш ' + post.text)
 
         response_before = self.user_one_client.get(reverse('index'))
         page_before_clear_cache_refresh = response_before.content
         self.assertEqual(page_before_clear_cache,
                          page_before_clear_cache_refresh)
 
-        cache.clear()
+        post.text = 'Правка ' + post.text
+        post.save()
         response_after = self.user_one_client.get(reverse('index'))
-        page_after_clear_cache = response_after.content
-        self.assertNotEqual(page_before_clear_cache, page_after_clear_cache)
+        page_after_save = response_after.content
+        self.assertNotEqual(page_before_clear_cache, page_after_save)
+        self.assertIn('Правка'.encode(), page_after_save)
+
+    def test_cache_stats(self):
+        """Попадания и промахи кэша страниц считаются."""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_DIR=directory):
+                self.user_one_client.get(reverse('index'))
+                self.user_one_client.get(reverse('index'))
+                stats = caching.stats()['index']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['ratio'], 0.5)
+
+    def test_cache_hit_does_not_write_to_cache(self):
+        """Показ закэшированной страницы только читает общий кэш."""
+        self.user_one_client.get(reverse('index'))
+        backend = caches['default']
+        names = ('set', 'add', 'incr', 'set_many')
+        for name in names:
+            write = mock.patch.object(backend, name,
+                                      wraps=getattr(backend, name))
+            write.start()
+            self.addCleanup(write.stop)
+        self.user_one_client.get(reverse('index'))
+        for name in names:
+            self.assertFalse(getattr(backend, name).called, name)
+
+    def test_post_card_fragment_cache(self):
+        """Карточка поста кэшируется до правки записи или комментария."""
+        url = reverse('post', args=[self.user_one, self.test_post.id])
+        self.user_one_client.get(url)
+        Post.objects.filter(pk=self.test_post.pk).update(text='Без сигнала')
+        response = self.user_one_client.get(url)
+        self.assertNotContains(response, 'Без сигнала')
+        self.assertContains(response, 'Редактировать')
+
+        self.user_one_client.post(
+            reverse('post_edit', args=[self.user_one, self.test_post.id]),
+            data={'text': 'Правка', 'group': self.test_group.id},
+        )
+        response = self.user_two_client.get(url)
+        self.assertContains(response, 'Правка')
+        self.assertNotContains(response, 'Редактировать')
+
+        self.user_two_client.post(
+            reverse('add_comment', args=[self.user_one, self.test_post.id]),
+            data={'text': 'comment'},
+        )
+        response = self.user_two_client.get(url)
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_post_card_follows_renames(self):
+        """Переименование автора и сообщества видно в карточке сразу."""
+        url = reverse('post', args=[self.user_one, self.test_post.id])
+        self.client.get(url)
+        Group.objects.filter(pk=self.test_group.pk).update(
+            title='Новое имя', slug='renamed')
+        response = self.client.get(url)
+        self.assertContains(response, '#Новое имя')
+        self.assertContains(response, reverse('group', args=['renamed']))
+        User.objects.filter(pk=self.user_one.pk).update(username='renamed')
+        response = self.client.get(
+            reverse('post', args=['renamed', self.test_post.id]))
+        self.assertContains(response, '@renamed')
+
+    def test_user_rename_expires_pages(self):
+        """После переименования лента показывает новое имя, а старый
+        адрес профиля отвечает 404."""
+        old_profile = reverse('profile', args=[self.user_one])
+        group = reverse('group', args=['group'])
+        for url in (reverse('index'), old_profile, group):
+            self.client.get(url)
+        self.user_one.username = 'renamed'
+        self.user_one.save()
+        self.assertContains(self.client.get(reverse('index')), '@renamed')
+        self.assertContains(self.client.get(group), '@renamed')
+        self.assertEqual(self.client.get(old_profile).status_code, 404)
+        self.assertEqual(self.client.get(
+            reverse('profile', args=['renamed'])).status_code, 200)
+
+    def test_group_rename_expires_pages(self):
+        """Новое название сообщества видно в профилях его авторов,
+        старый адрес сообщества отвечает 404."""
+        old_group = reverse('group', args=['group'])
+        profile = reverse('profile', args=[self.user_one])
+        self.client.get(old_group)
+        self.client.get(profile)
+        self.test_group.title = 'Новое название'
+        self.test_group.slug = 'renamed'
+        self.test_group.save()
+        self.assertEqual(self.client.get(old_group).status_code, 404)
+        self.assertContains(self.client.get(profile), '#Новое название')
+
+    def test_conditional_get(self):
+        """Неизменённые страницы отвечают 304, после правки - 200."""
+        Follow.objects.create(user=self.user_two, author=self.user_one)
+        urls = (
+            reverse('index'),
+            reverse('group', args=['group']),
+            reverse('profile', args=[self.user_one]),
+            reverse('post', args=[self.user_one, self.test_post.id]),
+            reverse('follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                # Первый ответ страницы с формой ставит куку CSRF
+                self.user_two_client.get(url)
+                etag = self.user_two_client.get(url)['ETag']
+                response = self.user_two_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+                self.test_post.text = 'Новая версия ' + url
+                self.test_post.save()
+                response = self.user_two_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_etag_follows_csrf_cookie(self):
+        """Новая кука CSRF даёт новый ETag страницы с формой."""
+        url = reverse('post', args=[self.user_one, self.test_post.id])
+        client = Client()
+        client.force_login(self.user_two)
+        client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        etag = client.get(url)['ETag']
+        self.assertEqual(client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_follow_feed_etag_reads_cache_once(self):
+        """ETag ленты подписок - одно чтение кэша при любом числе авторов."""
+        for number in range(5):
+            author = User.objects.create_user(username=f'author{number}')
+            Follow.objects.create(user=self.user_two, author=author)
+        url = reverse('follow_index')
+        self.user_two_client.get(url)
+        backend = caches['default']
+        reads = ('get', 'get_many', 'add')
+        for name in reads:
+            read = mock.patch.object(backend, name,
+                                     wraps=getattr(backend, name))
+            read.start()
+            self.addCleanup(read.stop)
+        etag = self.user_two_client.get(url)['ETag']
+        self.assertEqual(self.user_two_client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # По одному get_many на каждый из двух запросов
+        self.assertEqual(backend.get_many.call_count, 2)
+        self.assertFalse(backend.get.called)
+        self.assertFalse(backend.add.called)
+
+        Post.objects.create(text='Новое', author=author)
+        self.assertEqual(self.user_two_client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_release_changes_etag_and_page(self):
+        """После выкладки ETag и закэшированные страницы новые."""
+        url = reverse('index')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(METRICS_DIR=directory):
+            with override_settings(RELEASE='first'):
+                etag = self.client.get(url)['ETag']
+                self.client.get(url)
+            with override_settings(RELEASE='second'):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            stats = caching.stats()['index']
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertTrue(caching.release())
+
+    def test_etag_depends_on_viewer(self):
+        """Разные пользователи получают разные ETag одной страницы."""
+        url = reverse('index')
+        self.assertNotEqual(self.user_one_client.get(url)['ETag'],
+                            self.user_two_client.get(url)['ETag'])
 
     def test_url_templates(self):
         """Соответствие вызываемых шаблонов."""
@@ -310,3 +497,26 @@ class PaginatorViewsTest(TestCase):
     def test_second_page_containse_three_records(self):
         response = self.user_client.get(reverse('index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+    def test_cursor_pages_cover_all_records(self):
+        """Курсорные страницы идут без пропусков и возвращаются назад."""
+        url = reverse('index')
+        first = self.user_client.get(url).context['page']
+        self.assertEqual(len(first.object_list), 10)
+        self.assertIsNone(first.previous_cursor)
+
+        second = self.user_client.get(
+            url, {'after': first.next_cursor}).context['page']
+        self.assertEqual(len(second.object_list), 3)
+        self.assertIsNone(second.next_cursor)
+        self.assertFalse(
+            set(first.object_list) & set(second.object_list))
+
+        back = self.user_client.get(
+            url, {'before': second.previous_cursor}).context['page']
+        self.assertEqual(list(back.object_list), list(first.object_list))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый токен курсора открывает первую страницу."""
+        response = self.user_client.get(reverse('index'), {'after': '%%%'})
+        self.assertEqual(len(response.context['page'].object_list), 10)
@@ -0,0 +1,29 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка, что число запросов страницы не растёт вместе с данными."""
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(context.captured_queries)
+
+    def assertQueryBudget(self, client, url, grow, budget=None):
+        """Сравнивает число запросов до и после вызова grow().
+
+        grow добавляет на страницу записи или комментарии; budget,
+        если задан, ограничивает число запросов сверху.
+        """
+        before = self.count_queries(client, url)
+        grow()
+        after = self.count_queries(client, url)
+        self.assertEqual(
+            before, after,
+            f'{url}: число запросов выросло с {before} до {after}')
+        if budget is not None:
+            self.assertLessEqual(
+                after, budget,
+                f'{url}: {after} запросов при бюджете {budget}')
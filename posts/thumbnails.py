@@ -0,0 +1,378 @@
+"""Подготовка вариантов картинок постов вне запросов.
+
+Для карточки поста готовятся варианты нескольких ширин (WIDTHS)
+во всех форматах из FORMATS, которые умеет сохранять Pillow: AVIF,
+WebP и прогрессивный JPEG. Шаблон собирает из них <picture> со
+srcset, а без готового JPEG показывает заглушку.
+
+Варианты готовит пул фоновых потоков сразу после сохранения картинки,
+исходный файл при этом декодируется один раз. Какие варианты нужны,
+решает variants() по ширине картинки и при показе, и при подготовке.
+Страницы с постом сбрасываются из кэша, только если появились новые
+файлы или стали известны размеры картинки.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from yatube import metrics, timing
+
+from . import caching, feed
+from .models import Post
+from .storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+# Размер карточки поста, см. post_item.html.
+CARD_WIDTH, CARD_HEIGHT = 960, 339
+WIDTHS = (480, 960, 1440)
+# Форматы в порядке предпочтения, JPEG - для старых браузеров.
+FORMATS = ('AVIF', 'WEBP', 'JPEG')
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp',
+              'JPEG': 'image/jpeg'}
+# Ширина карточки в контейнере Bootstrap на разных экранах.
+SIZES = ('(min-width: 1200px) 1110px, (min-width: 992px) 930px, '
+         '(min-width: 768px) 690px, (min-width: 576px) 510px, 100vw')
+
+_lock = threading.Lock()
+_pending = set()
+_executor = None
+# Готовые миниатюры не меняются, поэтому их можно помнить в процессе.
+# Удаляет их только сборщик мусора, и тогда он начинает новое
+# поколение: процессы сверяют его не чаще раза в LRU_CHECK_SECONDS.
+_recent = OrderedDict()
+_generation = None
+_checked_at = None
+GENERATION_SCOPE = 'thumbnails'
+LRU_CHECK_SECONDS = 1
+
+
+class Variant(namedtuple('Variant', 'format width')):
+    @property
+    def geometry(self):
+        height = round(self.width * CARD_HEIGHT / CARD_WIDTH)
+        return f'{self.width}x{height}'
+
+    @property
+    def options(self):
+        # JPEG sorl-thumbnail и так сохраняет прогрессивным.
+        return {'crop': 'center', 'upscale': True, 'format': self.format}
+
+
+FALLBACK = Variant('JPEG', CARD_WIDTH)
+
+
+@lru_cache()
+def formats():
+    """Форматы из FORMATS, которые умеет сохранять установленный Pillow."""
+    Image.init()
+    return [format_ for format_ in FORMATS if format_ in Image.SAVE]
+
+
+def variants(image_width=None):
+    """Варианты картинки данной ширины, заведомо больших не делаем.
+
+    Пока ширина неизвестна, ожидаются все варианты: подготовка
+    заполняет размеры, и дальше набор совпадает с созданными файлами.
+    """
+    limit = max(image_width or WIDTHS[-1], CARD_WIDTH)
+    return [Variant(format_, width) for format_ in formats()
+            for width in WIDTHS if width <= limit]
+
+
+class Backend(ThumbnailBackend):
+    extensions = dict(EXTENSIONS, AVIF='avif')
+
+    def merged_options(self, source, options):
+        """Параметры миниатюры с умолчаниями, как в get_thumbnail."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(thumbnail_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, который вернул бы get_thumbnail.
+
+        Имя считается так же, как в ThumbnailBackend.get_thumbnail,
+        но без чтения исходной картинки.
+        """
+        source = ImageFile(file_, content_storage)
+        options = self.merged_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def variant_file(self, file_, variant):
+        return self.thumbnail_file(file_, variant.geometry, **variant.options)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        # Как в sorl-thumbnail, но со знанием расширения AVIF.
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = '%s/%s/%s' % (key[:2], key[2:4], key)
+        return '%s%s.%s' % (thumbnail_settings.THUMBNAIL_PREFIX, path,
+                            self.extensions[options['format']])
+
+
+backend = Backend()
+
+
+class Picture:
+    """Готовые варианты картинки для <picture> в карточке поста."""
+    sizes = SIZES
+    width = CARD_WIDTH
+    height = CARD_HEIGHT
+
+    def __init__(self, files):
+        self.src = files[FALLBACK].url
+        self.srcset = self._srcset(files, 'JPEG')
+        self.sources = [
+            {'type': MIME_TYPES[format_],
+             'srcset': self._srcset(files, format_)}
+            for format_ in formats()
+            if format_ != 'JPEG' and self._srcset(files, format_)
+        ]
+
+    @staticmethod
+    def _srcset(files, format_):
+        return ', '.join(f'{thumbnail.url} {variant.width}w'
+                         for variant, thumbnail in files.items()
+                         if variant.format == format_)
+
+
+def post_scopes(post):
+    """Области кэша страниц с карточкой поста, без запросов к базе."""
+    scopes = ['index', f'profile:{post.author.username}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def _recall(key):
+    with _lock:
+        thumbnail = _recent.get(key)
+        if thumbnail is not None:
+            _recent.move_to_end(key)
+        return thumbnail
+
+
+def _remember(thumbnails):
+    with _lock:
+        for thumbnail in thumbnails:
+            _recent[thumbnail.key] = thumbnail
+            _recent.move_to_end(thumbnail.key)
+        while len(_recent) > settings.THUMBNAIL_LRU_SIZE:
+            _recent.popitem(last=False)
+
+
+def forget():
+    """Забывает запомненные миниатюры, например после удаления файлов."""
+    with _lock:
+        _recent.clear()
+
+
+def discard():
+    """Миниатюры удалены: все процессы забывают запомненные."""
+    caching.bump(GENERATION_SCOPE)
+    forget()
+
+
+def _sync():
+    """Забывает миниатюры, если другой процесс начал новое поколение."""
+    global _generation, _checked_at
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < LRU_CHECK_SECONDS:
+        return
+    _checked_at = now
+    generation = caching.generations([GENERATION_SCOPE])[0]
+    if generation != _generation:
+        forget()
+        _generation = generation
+
+
+def _lookup(files):
+    """Готовые миниатюры по ключам: из памяти, остальные одним чтением."""
+    _sync()
+    found, missing = {}, []
+    for thumbnail in files:
+        cached = _recall(thumbnail.key)
+        if cached is None:
+            missing.append(thumbnail)
+        else:
+            found[thumbnail.key] = cached
+    if missing:
+        loaded = default.kvstore.get_many(missing)
+        _remember(loaded.values())
+        found.update(loaded)
+    return found
+
+
+def _post_files(post):
+    return {variant: backend.variant_file(post.image, variant)
+            for variant in variants(post.image_width)}
+
+
+def prefetch(posts):
+    """Загружает миниатюры страницы постов одним чтением хранилища.
+
+    Найденные миниатюры запоминаются в процессе, и ready() для этих
+    постов уже не обращается к хранилищу.
+    """
+    with timing.phase('thumb'):
+        _lookup([thumbnail for post in posts if post.image
+                 for thumbnail in _post_files(post).values()])
+
+
+def ready(post):
+    """Готовые варианты картинки поста (Picture) или None.
+
+    Если каких-то вариантов ещё нет, их подготовка ставится в очередь.
+    """
+    with timing.phase('thumb'):
+        return _ready(post)
+
+
+def _ready(post):
+    files = _post_files(post)
+    found = _lookup(files.values())
+    if len(found) < len(files):
+        schedule(post)
+    fallback = files[FALLBACK]
+    if fallback.key not in found:
+        if not fallback.exists():
+            return None
+        found[fallback.key] = fallback
+    return Picture({variant: found[thumbnail.key]
+                    for variant, thumbnail in files.items()
+                    if thumbnail.key in found})
+
+
+def _executor_instance():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+    return _executor
+
+
+def schedule(post):
+    """Ставит подготовку вариантов картинки поста в очередь пула."""
+    name = post.image.name
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    timing.record('thumb', 0, thumb_scheduled=1)
+    _executor_instance().submit(_generate_pending, name, post_scopes(post),
+                                post.image_width is None, post.author_id)
+
+
+def _generate_pending(name, scopes, size_unknown=False, author_id=None):
+    try:
+        result = _produce(name)
+        if result is None:
+            return
+        size, created = result
+        if (size_unknown and store_size(name, size)) or created:
+            caching.bump(*scopes)
+            if author_id is not None:
+                feed.expire(author_id)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def store_size(name, size):
+    """Заполняет неизвестные размеры картинки, возвращает число постов.
+
+    Без размеров variants() ждёт вариант шириной WIDTHS[-1], которого
+    у узкой картинки не будет, и показ снова ставил бы её в очередь.
+    """
+    return Post.objects.filter(image=name, image_width=None).update(
+        image_width=size[0], image_height=size[1])
+
+
+def _source_exists(name):
+    try:
+        return content_storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def _generate(name):
+    """Размеры картинки и число созданных файлов миниатюр."""
+    source = ImageFile(name, content_storage)
+    image = default.engine.get_image(source)
+    created = 0
+    try:
+        size = default.engine.get_image_size(image)
+        source.set_size(size)
+        image_info = default.engine.get_image_info(image)
+        for variant in variants(size[0]):
+            thumbnail = backend.variant_file(name, variant)
+            if thumbnail.exists():
+                _touch(thumbnail)
+            else:
+                options = backend.merged_options(source, variant.options)
+                options['image_info'] = image_info
+                backend._create_thumbnail(image, variant.geometry, options,
+                                          thumbnail)
+                created += 1
+            default.kvstore.set(thumbnail)
+    finally:
+        default.engine.cleanup(image)
+    return size, created
+
+
+def _touch(thumbnail):
+    """Свежее время изменения: снова нужная миниатюра не попадёт в мусор."""
+    try:
+        os.utime(thumbnail.storage.path(thumbnail.name))
+    except (FileNotFoundError, NotImplementedError):
+        pass
+
+
+def _produce(name):
+    try:
+        if not _source_exists(name):
+            return None
+        with metrics.THUMBNAIL_SECONDS.time():
+            return _generate(name)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры %s', name)
+        return None
+
+
+def generate(name):
+    """Готовит все варианты картинки, возвращает её размеры или None."""
+    result = _produce(name)
+    return result and result[0]
+
+
+def wait():
+    """Дожидается всех поставленных в очередь миниатюр."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,98 @@
+"""Загрузка картинок постов с ограничением памяти.
+
+LimitedUploadHandler стоит первым в FILE_UPLOAD_HANDLERS и перестаёт
+передавать файл дальше, как только он превысил POSTS_UPLOAD_MAX_BYTES:
+в памяти или во временном файле остаётся не больше этого предела.
+
+sanitize() проверяет формат и размеры по заголовку картинки, не
+декодируя её, и пересохраняет картинку без EXIF. JPEG декодируется
+сразу в уменьшенном масштабе (draft), остальные форматы ограничены
+POSTS_IMAGE_MAX_PIXELS.
+"""
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Параметры пересохранения, EXIF не передаётся ни в одном формате.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+class RejectedUpload(UploadedFile):
+    """Пустая замена файла, который превысил предел размера."""
+    too_large = True
+
+    def __init__(self, name, content_type, size):
+        super().__init__(SpooledTemporaryFile(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_UPLOAD_MAX_BYTES:
+            # Следующие обработчики больше ничего не получат.
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.received > settings.POSTS_UPLOAD_MAX_BYTES:
+            return RejectedUpload(self.file_name, self.content_type,
+                                  self.received)
+        return None
+
+
+def _open(upload):
+    """Картинка с прочитанным заголовком, пиксели ещё не декодированы."""
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Exception:
+        raise ValidationError('Файл не похож на картинку.')
+    if image.format not in FORMATS:
+        raise ValidationError(
+            'Поддерживаются только JPEG, PNG, GIF и WebP.')
+    width, height = image.size
+    if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Картинка слишком большая: {width}x{height} пикселей.')
+    return image
+
+
+def sanitize(upload):
+    """Проверенная картинка без EXIF и не больше POSTS_IMAGE_MAX_SIDE.
+
+    GIF возвращается как есть: EXIF в нём нет, а пересохранение
+    потеряло бы анимацию.
+    """
+    image = _open(upload)
+    format_ = image.format
+    if format_ == 'GIF':
+        upload.seek(0)
+        return upload
+    side = settings.POSTS_IMAGE_MAX_SIDE
+    # draft уменьшает JPEG, только если обе стороны не меньше запрошенных.
+    scale = min(1, side / max(image.size))
+    image.draft('RGB', (int(image.width * scale), int(image.height * scale)))
+    # Поворот по EXIF уже после уменьшения: копия картинки будет малой.
+    image.thumbnail((side, side))
+    image = ImageOps.exif_transpose(image)
+    content = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    options = dict(SAVE_OPTIONS[format_])
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    image.save(content, format_, **options)
+    return UploadedFile(content, upload.name, Image.MIME[format_],
+                        content.tell())
@@ -1,30 +1,34 @@
-from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
 from .models import Post, Group, User, Follow
+from . import thumbnails
+from .caching import cached_page, scope_etag
+from .feed import follow_feed, follow_feed_etag
 from .forms import PostForm, CommentForm
+from .paginators import paginate
+from .search import search
 
 
-@cache_page(20)
+@condition(etag_func=scope_etag('index'))
+@cached_page('index')
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    paginator, page = paginate(request, post_list)
+    thumbnails.prefetch(page.object_list)
     return render(request, 'index.html',
                   {'page': page, 'paginator': paginator, 'index': True, }
                   )
 
 
+@condition(etag_func=scope_etag('group:{slug}'))
+@cached_page('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    author = Group.objects.get(slug=slug)
-    post_list = author.posts.all().order_by("-pub_date")
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    post_list = group.posts.select_related('author', 'group')
+    paginator, page = paginate(request, post_list)
+    thumbnails.prefetch(page.object_list)
     context = {
         "group": group,
         "page": page,
@@ -33,6 +37,18 @@ def group_posts(request, slug):
     return render(request, "group.html", context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search(query, after=request.GET.get('after'))
+    thumbnails.prefetch(posts)
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'search.html', context)
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -45,12 +61,14 @@ def new_post(request):
     return render(request, 'new.html', {'form': form})
 
 
+@condition(etag_func=scope_etag('profile:{username}'))
+@cached_page('profile:{username}')
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    user = get_object_or_404(User.objects.select_related('stats'),
+                             username=username)
+    posts = user.posts.select_related('author', 'group')
+    paginator, page = paginate(request, posts)
+    thumbnails.prefetch(page.object_list)
     is_follow = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=user).exists()
     context = {
@@ -62,13 +80,16 @@ def profile(request, username):
     return render(request, 'profile.html', context)
 
 
+@condition(etag_func=scope_etag('profile:{username}'))
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author', 'group'),
+                             author__username=username, id=post_id)
 
     context = {
         'post': post,
         'author': post.author,
-        'comments': post.comments.all(),
+        'comments': post.comments.select_related('author').order_by(
+            'created'),
         'form': CommentForm(),
     }
 
@@ -113,10 +134,11 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@condition(etag_func=follow_feed_etag)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page = paginator.get_page(request.GET.get('page'))
+    post_list = follow_feed(request.user).select_related('author', 'group')
+    paginator, page = paginate(request, post_list)
+    thumbnails.prefetch(page.object_list)
 
     context = {
         'page': page,
@@ -0,0 +1,9 @@
+import pytest
+
+from yatube.testing import isolated
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_settings():
+    with isolated():
+        yield
@@ -0,0 +1,308 @@
+"""Общий для всех процессов кэш в файле SQLite.
+
+В отличие от LocMemCache, одна копия кэша видна всем воркерам WSGI,
+а сброс ключа в одном процессе сразу виден в остальных. Внешний
+сервис не нужен: достаточно файла на локальном диске.
+
+Настройки OPTIONS:
+    MAX_ENTRIES, CULL_FREQUENCY - как у встроенных бэкендов;
+    MAX_SIZE - предел суммарного размера значений в байтах;
+    STALE_TIMEOUT - сколько секунд после истечения хранить значение,
+        чтобы get_or_set отдавал его, пока другой воркер пересчитывает;
+    LOCK_TIMEOUT - сколько секунд живёт блокировка пересчёта ключа.
+
+Вытеснение приблизительное LRU: время обращения обновляется не чаще
+раза в ACCESS_RESOLUTION секунд, а проверка пределов выполняется раз
+в CULL_EVERY записей.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics, timing
+
+ACCESS_RESOLUTION = 1.0
+CULL_EVERY = 20
+QUERY_CHUNK = 500
+WAIT_INTERVAL = 0.05
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_locks (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+);
+'''
+
+_missing = object()
+
+
+def _observe(started, hits=(), misses=()):
+    """Отмечает чтение ключей кэша в Server-Timing и метриках."""
+    timing.record('cache', time.perf_counter() - started,
+                  cache_hits=len(hits), cache_misses=len(misses))
+    counts = Counter((metrics.cache_family(key), result)
+                     for result, keys in (('hit', hits), ('miss', misses))
+                     for key in keys)
+    for (family, result), count in counts.items():
+        metrics.CACHE_REQUESTS.inc(count, family=family, result=result)
+
+
+def _is_fresh(expires, now):
+    return expires is None or expires > now
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._stale_timeout = float(options.get('STALE_TIMEOUT', 60))
+        self._lock_timeout = float(options.get('LOCK_TIMEOUT', 10))
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = pid
+            self._local.writes = 0
+        return self._local.connection
+
+    @contextmanager
+    def _write(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        self._local.writes += 1
+        if self._local.writes % CULL_EVERY == 0:
+            self._cull()
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fetch(self, key):
+        """Значение и срок жизни ключа или (_missing, None)."""
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            return _missing, None
+        value, expires, accessed = row
+        if accessed < now - ACCESS_RESOLUTION:
+            connection.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value), expires
+
+    def _store(self, connection, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        connection.execute(
+            'INSERT OR REPLACE INTO cache '
+            '(key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+            (key, data, len(data), self.get_backend_timeout(timeout),
+             time.time()))
+
+    def get(self, key, default=None, version=None):
+        started = time.perf_counter()
+        value, expires = self._fetch(self._key(key, version))
+        if value is not _missing and _is_fresh(expires, time.time()):
+            _observe(started, hits=[key])
+            return value
+        _observe(started, misses=[key])
+        return default
+
+    def get_many(self, keys, version=None):
+        started = time.perf_counter()
+        keys = {self._key(key, version): key for key in keys}
+        now = time.time()
+        result = {}
+        made = list(keys)
+        connection = self._connection()
+        for start in range(0, len(made), QUERY_CHUNK):
+            chunk = made[start:start + QUERY_CHUNK]
+            rows = connection.execute(
+                'SELECT key, value, expires FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(chunk)), chunk)
+            for key, value, expires in rows:
+                if _is_fresh(expires, now):
+                    result[keys[key]] = pickle.loads(value)
+        _observe(started, hits=list(result),
+                 misses=[key for key in keys.values() if key not in result])
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            self._store(connection, key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as connection:
+            for key, value in data.items():
+                self._store(connection, self._key(key, version), value,
+                            timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and _is_fresh(row[0], time.time()):
+                return False
+            self._store(connection, key, value, timeout)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        made = self._key(key, version)
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (made,)).fetchone()
+            if row is None or not _is_fresh(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?', (data, len(data), time.time(), made))
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            changed = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount
+        return bool(changed)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            deleted = connection.execute(
+                'DELETE FROM cache WHERE key = ?', (key,)).rowcount
+        return bool(deleted)
+
+    def delete_many(self, keys, version=None):
+        made = [self._key(key, version) for key in keys]
+        with self._write() as connection:
+            for start in range(0, len(made), QUERY_CHUNK):
+                chunk = made[start:start + QUERY_CHUNK]
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (%s)'
+                    % ', '.join('?' * len(chunk)), chunk)
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache')
+            connection.execute('DELETE FROM cache_locks')
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """get_or_set с пересчётом ключа только в одном воркере.
+
+        Пока один процесс вычисляет default, остальные получают
+        устаревшее значение, а если его нет - ждут до LOCK_TIMEOUT.
+        """
+        made = self._key(key, version)
+        deadline = time.monotonic() + self._lock_timeout
+        while True:
+            started = time.perf_counter()
+            value, expires = self._fetch(made)
+            if value is not _missing and _is_fresh(expires, time.time()):
+                _observe(started, hits=[key])
+                return value
+            _observe(started, misses=[key])
+            if self._acquire(made):
+                try:
+                    value = default() if callable(default) else default
+                    if value is not None:
+                        self.set(key, value, timeout, version)
+                    return value
+                finally:
+                    self._release(made)
+            if value is not _missing:
+                return value
+            if time.monotonic() > deadline:
+                return default() if callable(default) else default
+            time.sleep(WAIT_INTERVAL)
+
+    def _acquire(self, key):
+        now = time.time()
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache_locks WHERE key = ? AND expires < ?',
+                (key, now))
+            acquired = connection.execute(
+                'INSERT OR IGNORE INTO cache_locks (key, expires) '
+                'VALUES (?, ?)', (key, now + self._lock_timeout)).rowcount
+        return bool(acquired)
+
+    def _release(self, key):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache_locks WHERE key = ?', (key,))
+
+    def _cull(self):
+        """Удаляет просроченные и давно не читанные ключи сверх пределов."""
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'DELETE FROM cache WHERE expires IS NOT NULL '
+                'AND expires < ?', (now - self._stale_timeout,))
+            count, size = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()
+            step = max(1, count // self._cull_frequency)
+            while count > self._max_entries or size > self._max_size:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                    (step,))
+                count, size = connection.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+                ).fetchone()
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами.
+        pass
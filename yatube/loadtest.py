@@ -0,0 +1,339 @@
+"""Нагрузка на весь стек WSGI внутри процесса, без внешних утилит.
+
+Шаг нагрузки - словарь {'view', 'method', 'path', 'data', 'user'}:
+имя представления для отчёта, запрос и id пользователя (None -
+аноним). Шаги одного посетителя идут одному исполнителю по порядку,
+поэтому куки и токен CSRF переживают переход от формы к её отправке.
+Шаг с 'next': True листает ленту, как читатель: идёт по ссылке
+?after= из предыдущего ответа, а без неё пропускается.
+
+Шаги берутся из смеси сценариев (Mix) или из журнала
+запросов живого сайта: если задан REQUEST_LOG, RequestLogMiddleware
+дописывает в него каждый запрос строкой JSON, и журнал можно
+воспроизвести (replay_steps). Запускает нагрузку команда load_test.
+"""
+import html
+import json
+import os
+import random
+import re
+import sys
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+from io import BytesIO
+from urllib.parse import unquote_to_bytes, urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth import login as login_user
+from django.db import connections
+from django.http import HttpRequest
+from django.urls import reverse
+
+CSRF_FIELD = 'csrfmiddlewaretoken'
+CSRF_INPUT = re.compile(
+    r'name="csrfmiddlewaretoken" value="([^"]+)"'.encode())
+# Ссылка на следующую страницу курсорной ленты, см. paginator.html
+NEXT_LINK = re.compile(r'href="(\?after=[^"]+)"'.encode())
+# Поля форм, которые не попадают в журнал
+SECRET_FIELDS = re.compile(r'csrf|pass', re.IGNORECASE)
+# Доля визитов на открытые страницы от вошедших пользователей
+LOGGED_IN_SHARE = 0.5
+# Глубже этой страницы ленту почти не листают
+MAX_PAGE = 5
+
+
+class RequestLogMiddleware:
+    """Пишет запросы в REQUEST_LOG, чтобы потом воспроизвести нагрузку.
+
+    Пароли, токены CSRF и файлы не сохраняются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        path = settings.REQUEST_LOG
+        if path:
+            match = request.resolver_match
+            data = None
+            if request.method == 'POST':
+                data = {name: value for name, value in request.POST.items()
+                        if not SECRET_FIELDS.search(name)}
+            _write(path, {
+                'time': time.time(),
+                'view': match.view_name if match else 'unmatched',
+                'method': request.method,
+                'path': request.get_full_path(),
+                'data': data,
+                'user': (request.user.pk
+                         if request.user.is_authenticated else None),
+                'status': response.status_code,
+            })
+        return response
+
+
+def _write(path, entry):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    with open(path, 'a', encoding='utf-8') as log:
+        log.write(line)
+
+
+def login(user_id):
+    """Ключ сессии вошедшего пользователя, без проверки пароля."""
+    engine = import_module(settings.SESSION_ENGINE)
+    request = HttpRequest()
+    request.session = engine.SessionStore()
+    login_user(request, get_user_model().objects.get(pk=user_id),
+               'django.contrib.auth.backends.ModelBackend')
+    request.session.save()
+    return request.session.session_key
+
+
+class VirtualUser:
+    """Посетитель со своими куками, который ходит прямо в WSGI."""
+
+    def __init__(self, application, session_key=None):
+        self.application = application
+        self.cookies = {}
+        self.csrf_token = None
+        self.next_page = None
+        if session_key is not None:
+            self.cookies[settings.SESSION_COOKIE_NAME] = session_key
+
+    def environ(self, method, path, body=b''):
+        path, _, query = path.partition('?')
+        return {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': unquote_to_bytes(path).decode('iso-8859-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': 'localhost',
+            'HTTP_COOKIE': '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+    def request(self, method, path, data=None):
+        """Выполняет запрос и возвращает код ответа."""
+        body = b''
+        if method == 'POST':
+            if self.csrf_token is None:
+                self.request('GET', reverse('login'))
+            body = urlencode(dict(data or {}, **{
+                CSRF_FIELD: self.csrf_token or ''})).encode()
+        status = []
+
+        def start_response(line, headers, exc_info=None):
+            status.append(int(line.split()[0]))
+            for name, value in headers:
+                if name.lower() == 'set-cookie':
+                    self.store_cookies(value)
+
+        result = self.application(self.environ(method, path, body),
+                                  start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        token = CSRF_INPUT.search(content)
+        if token:
+            self.csrf_token = token.group(1).decode()
+        link = NEXT_LINK.search(content)
+        self.next_page = link and html.unescape(link.group(1).decode())
+        return status[0]
+
+    def store_cookies(self, header):
+        for name, morsel in SimpleCookie(header).items():
+            if morsel['max-age'] == '0' or not morsel.value:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = morsel.value
+
+
+def run_worker(steps, sessions=None):
+    """Выполняет шаги по порядку: [(view, код или None, секунды, ошибка)].
+
+    sessions - ключи сессий по id пользователя, заранее созданные
+    login(): иначе исполнители входят сами и спорят за запись в базу.
+    Функция верхнего уровня, чтобы её можно было отдать пулу процессов.
+    """
+    # Не на уровне модуля: модуль грузится вместе с настройками
+    from yatube.wsgi import application
+
+    visitors = {}
+    results = []
+    try:
+        for step in steps:
+            user = step.get('user')
+            if user not in visitors:
+                session_key = (sessions or {}).get(user)
+                if session_key is None and user is not None:
+                    session_key = login(user)
+                visitors[user] = VirtualUser(application, session_key)
+            path = step['path']
+            if step.get('next'):
+                # Лента кончилась раньше, чем хотел листать посетитель
+                if visitors[user].next_page is None:
+                    continue
+                path = path.partition('?')[0] + visitors[user].next_page
+            started = time.perf_counter()
+            status, error = None, None
+            try:
+                status = visitors[user].request(
+                    step['method'], path, step.get('data'))
+            except Exception as exc:
+                error = f'{type(exc).__name__}: {exc}'
+            view = step['view']
+            if step['method'] == 'POST':
+                view += ' POST'
+            results.append((view, status,
+                            time.perf_counter() - started, error))
+    finally:
+        connections.close_all()
+    return results
+
+
+class Mix:
+    """Смесь сценариев: лента с листанием, сообщества, профили, посты,
+    лента подписок, отправка комментариев и постов через формы.
+    """
+
+    def __init__(self, seed=0):
+        from posts.models import Follow, Group, Post
+
+        self.rnd = random.Random(seed)
+        self.posts = list(Post.objects.order_by('-pk').values_list(
+            'pk', 'author__username')[:1000])
+        self.groups = list(Group.objects.order_by('-posts_count')
+                           .values_list('slug', flat=True)[:100])
+        self.readers = list(Follow.objects.order_by('user_id').values_list(
+            'user_id', flat=True).distinct()[:200])
+        # Сценарий, вес, нужен ли вход
+        self.scenarios = [
+            (self.feed, 30, False), (self.group, 10, False),
+            (self.profile, 10, False), (self.post, 25, False),
+            (self.follow, 10, True), (self.comment, 10, True),
+            (self.new_post, 5, True),
+        ]
+
+    @staticmethod
+    def step(view, path, user, method='GET', data=None):
+        return {'view': view, 'method': method, 'path': path,
+                'data': data, 'user': user}
+
+    def feed(self, user):
+        # Дальше первой страницы - по курсору из ответа, а не ?page=N:
+        # номера страниц ведут на запасной путь с OFFSET и COUNT(*)
+        steps = [self.step('index', reverse('index'), user)]
+        for _ in range(2, self.rnd.randint(1, MAX_PAGE) + 1):
+            steps.append(dict(self.step('index', reverse('index'), user),
+                              next=True))
+        return steps
+
+    def group(self, user):
+        if not self.groups:
+            return self.feed(user)
+        return [self.step('group', reverse(
+            'group', args=[self.rnd.choice(self.groups)]), user)]
+
+    def profile(self, user):
+        return [self.step('profile', reverse(
+            'profile', args=[self.rnd.choice(self.posts)[1]]), user)]
+
+    def post(self, user):
+        pk, username = self.rnd.choice(self.posts)
+        return [self.step('post', reverse('post', args=[username, pk]),
+                          user)]
+
+    def follow(self, user):
+        return [self.step('follow_index', reverse('follow_index'), user)]
+
+    def comment(self, user):
+        pk, username = self.rnd.choice(self.posts)
+        return [
+            self.step('post', reverse('post', args=[username, pk]), user),
+            self.step('add_comment',
+                      reverse('add_comment', args=[username, pk]), user,
+                      'POST', {'text': 'Нагрузочный комментарий'}),
+        ]
+
+    def new_post(self, user):
+        return [
+            self.step('new_post', reverse('new_post'), user),
+            self.step('new_post', reverse('new_post'), user, 'POST',
+                      {'text': 'Нагрузочный пост', 'group': ''}),
+        ]
+
+    def visits(self, count):
+        """Визиты, пока не наберётся count шагов.
+
+        Каждый визит - список шагов одного посетителя.
+        """
+        if not self.posts or not self.readers:
+            return []
+        weights = [weight for _, weight, _ in self.scenarios]
+        visits, total = [], 0
+        while total < count:
+            scenario, _, needs_login = self.rnd.choices(
+                self.scenarios, weights)[0]
+            user = None
+            if needs_login or self.rnd.random() < LOGGED_IN_SHARE:
+                user = self.rnd.choice(self.readers)
+            visit = scenario(user)
+            visits.append(visit)
+            total += len(visit)
+        return visits
+
+
+def replay_steps(lines):
+    """Визиты из журнала REQUEST_LOG: запросы каждого пользователя подряд.
+
+    Анонимные запросы в журнале не связаны друг с другом и идут
+    по одному.
+    """
+    visits, by_user = [], {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        step = {name: entry.get(name)
+                for name in ('view', 'method', 'path', 'data', 'user')}
+        if step['user'] is None:
+            visits.append([step])
+        elif step['user'] in by_user:
+            by_user[step['user']].append(step)
+        else:
+            by_user[step['user']] = [step]
+            visits.append(by_user[step['user']])
+    return visits
+
+
+def sessions(visits):
+    """Сессии всех пользователей визитов, до запуска исполнителей."""
+    users = {step['user'] for visit in visits for step in visit}
+    return {user: login(user) for user in users if user is not None}
+
+
+def split(visits, workers):
+    """Делит визиты между исполнителями, не разрывая визит."""
+    queues = [[] for _ in range(workers)]
+    for number, visit in enumerate(visits):
+        queues[number % workers].extend(visit)
+    return [queue for queue in queues if queue]
@@ -0,0 +1,291 @@
+"""Метрики в текстовом формате Prometheus, общие для всех воркеров.
+
+Каждый процесс пишет свои значения в отдельный файл METRICS_DIR/<pid>.db,
+отображённый в память: запись - это поиск смещения в словаре и
+перезапись восьми байт под блокировкой процесса, без межпроцессных
+блокировок и системных вызовов. Страница /metrics складывает значения
+всех файлов. Файлы завершившихся процессов остаются: счётчики
+не должны уменьшаться, а процесс с тем же pid продолжит свой файл.
+
+Формат файла: заголовок - занятый размер (uint32), затем записи
+[длина ключа uint32][ключ utf-8, выравнивание до 8][значение double].
+Новая запись сначала пишется целиком, а потом сдвигается заголовок,
+поэтому читатели видят только готовые записи.
+"""
+import glob
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import timing
+
+INITIAL_SIZE = 64 * 1024
+HEADER = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+# Границы корзин гистограмм времени в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _entries(data, used):
+    """Записи файла: тройки (ключ, значение, смещение значения)."""
+    position = HEADER.size
+    while position < used:
+        length = HEADER.unpack_from(data, position)[0]
+        key_at = position + HEADER.size
+        value_at = (key_at + length + 7) // 8 * 8
+        key = bytes(data[key_at:key_at + length]).decode()
+        yield key, VALUE.unpack_from(data, value_at)[0], value_at
+        position = value_at + VALUE.size
+
+
+class Segment:
+    """Значения метрик одного процесса в файле, отображённом в память."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+        self._map()
+        self.used = HEADER.unpack_from(self.data, 0)[0] or HEADER.size
+        self.positions = {key: position for key, _, position
+                          in _entries(self.data, self.used)}
+
+    def _map(self):
+        self.data = mmap.mmap(self.file.fileno(), 0)
+
+    def _allocate(self, key):
+        encoded = key.encode()
+        key_at = self.used + HEADER.size
+        value_at = (key_at + len(encoded) + 7) // 8 * 8
+        end = value_at + VALUE.size
+        size = len(self.data)
+        if end > size:
+            self.data.close()
+            self.file.truncate(max(end, size * 2))
+            self._map()
+        HEADER.pack_into(self.data, self.used, len(encoded))
+        self.data[key_at:key_at + len(encoded)] = encoded
+        VALUE.pack_into(self.data, value_at, 0.0)
+        HEADER.pack_into(self.data, 0, end)
+        self.used = end
+        self.positions[key] = value_at
+        return value_at
+
+    def add(self, items):
+        """Прибавляет значения к ключам: items - пары (ключ, число)."""
+        with self.lock:
+            for key, amount in items:
+                position = self.positions.get(key)
+                if position is None:
+                    position = self._allocate(key)
+                value = VALUE.unpack_from(self.data, position)[0]
+                VALUE.pack_into(self.data, position, value + amount)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+_segment = None
+_segment_lock = threading.Lock()
+
+
+def segment():
+    """Файл метрик текущего процесса, после fork - новый."""
+    global _segment
+    path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.db')
+    current = _segment
+    if current is not None and current[0] == path:
+        return current[1]
+    with _segment_lock:
+        if _segment is None or _segment[0] != path:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            _segment = (path, Segment(path))
+        return _segment[1]
+
+
+def collect():
+    """Сумма значений по всем файлам метрик."""
+    totals = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < HEADER.size:
+            continue
+        used = min(HEADER.unpack_from(data, 0)[0], len(data))
+        for key, value, _ in _entries(data, used):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{values[name]}"' for name in names)
+
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry.append(self)
+
+    def key(self, suffix='', **labels):
+        return f'{self.name}{suffix}{{{_labels(self.labels, labels)}}}'
+
+    def samples(self, totals):
+        prefix = f'{self.name}{{'
+        return sorted((key, value) for key, value in totals.items()
+                      if key.startswith(prefix))
+
+    def exposition(self, totals):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{key.replace("{}", "")} {_number(value)}'
+                     for key, value in self.samples(totals))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        segment().add([(self.key(**labels), amount)])
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.sample = re.compile(
+            rf'^{name}(_bucket|_sum|_count)\{{(.*?),?(?:le="(.*)")?\}}$')
+
+    def bucket_key(self, le, **labels):
+        labels = _labels(self.labels + ('le',), dict(labels, le=le))
+        return f'{self.name}_bucket{{{labels}}}'
+
+    def observe(self, value, **labels):
+        # Корзины накопительные: значение попадает во все, где le >= value,
+        # к остальным прибавляется 0, чтобы они были в выводе
+        items = [(self.bucket_key(le, **labels), int(value <= le))
+                 for le in self.buckets]
+        items.append((self.bucket_key('+Inf', **labels), 1))
+        items.append((self.key('_sum', **labels), value))
+        items.append((self.key('_count', **labels), 1))
+        segment().add(items)
+
+    @contextmanager
+    def time(self, **labels):
+        """Наблюдает время выполнения блока."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self, totals):
+        samples = []
+        for key, value in totals.items():
+            match = self.sample.match(key)
+            if match:
+                suffix, labels, le = match.groups()
+                order = (labels, suffix != '_bucket', suffix,
+                         float('inf' if le == '+Inf' else le or 0))
+                samples.append((order, key, value))
+        return [(key, value) for _, key, value in sorted(samples)]
+
+
+registry = []
+
+VIEW_SECONDS = Histogram(
+    'yatube_view_duration_seconds', 'Время ответа по имени URL.',
+    ('view', 'method'))
+VIEW_RESPONSES = Counter(
+    'yatube_view_responses_total', 'Ответы по имени URL и статусу.',
+    ('view', 'status'))
+DB_QUERIES = Counter(
+    'yatube_db_queries_total', 'Запросы к базе по имени URL.', ('view',))
+DB_SECONDS = Counter(
+    'yatube_db_query_seconds_total', 'Время запросов к базе по имени URL.',
+    ('view',))
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Чтения кэша по семействам ключей: hit или miss.',
+    ('family', 'result'))
+PAGE_CACHE_REQUESTS = Counter(
+    'yatube_page_cache_requests_total',
+    'Обращения к кэшу страниц по представлениям: hit или miss.',
+    ('view', 'result'))
+UPLOAD_SECONDS = Histogram(
+    'yatube_upload_processing_seconds',
+    'Проверка и пересжатие загруженных картинок.')
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Подготовка всех вариантов миниатюр одной картинки.')
+
+FAMILY = re.compile(r'[A-Za-z][\w-]*')
+
+
+def cache_family(key):
+    """Семейство ключа кэша: начало ключа до первого разделителя."""
+    match = FAMILY.match(key)
+    return match.group() if match else 'other'
+
+
+def exposition():
+    totals = collect()
+    lines = []
+    for metric in registry:
+        lines.extend(metric.exposition(totals))
+    return '\n'.join(lines) + '\n'
+
+
+def view(request):
+    """Страница /metrics для сотрудников и адресов METRICS_ALLOWED_IPS."""
+    user = getattr(request, 'user', None)
+    allowed = ((user is not None and user.is_staff)
+               or request.META.get('REMOTE_ADDR')
+               in settings.METRICS_ALLOWED_IPS)
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Время ответа, статусы и запросы к базе по имени URL.
+
+    Стоит после ServerTimingMiddleware и берёт из него счётчики SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        name = match.view_name if match else 'unmatched'
+        VIEW_SECONDS.observe(elapsed, view=name, method=request.method)
+        VIEW_RESPONSES.inc(view=name, status=response.status_code)
+        timings = timing.current()
+        if timings is not None:
+            DB_QUERIES.inc(timings.counts['sql_count'], view=name)
+            DB_SECONDS.inc(timings.durations['sql'], view=name)
+        return response
@@ -0,0 +1,160 @@
+"""Отдача медиафайлов через фронтовой сервер.
+
+Вьюха serve проверяет путь и условные заголовки, а сам файл отдаёт
+фронтовой сервер по заголовку из настройки SENDFILE_BACKEND:
+    'x-accel-redirect' - nginx, файл ищется по внутреннему адресу
+        internal_url (location с директивой internal);
+    'x-sendfile' - Apache mod_xsendfile или lighttpd, по полному пути.
+Без фронтового сервера (None) файл отдаёт FileResponse: WSGI-сервер
+с wsgi.file_wrapper (gunicorn, uWSGI) пересылает его через sendfile,
+а запросы Range получают ответ 206 с нужным куском файла.
+
+Имена загрузок не переиспользуются, поэтому файлы кэшируются надолго.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+BLOCK_SIZE = 64 * 1024
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """Кусок открытого файла.
+
+    read() не выходит за конец куска, а fileno() позволяет WSGI-серверу
+    отправить кусок через sendfile с текущей позиции.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _byte_range(request, size, etag, last_modified):
+    """Запрошенный кусок (start, end) или None, если нужен весь файл.
+
+    Несколько кусков в одном заголовке не поддерживаются, на такие
+    запросы отдаётся весь файл, как разрешает RFC 7233.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = BYTE_RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range not in (etag, http_date(last_modified)):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _file_response(request, path, stat, content_type, etag):
+    try:
+        byte_range = _byte_range(request, stat.st_size, etag,
+                                 stat.st_mtime)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    start, end = byte_range or (0, stat.st_size - 1)
+    length = end - start + 1
+    response = FileResponse(FileRange(open(path, 'rb'), start, length),
+                            content_type=content_type)
+    response.block_size = BLOCK_SIZE
+    response['Content-Length'] = length
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return response
+
+
+def send(request, full_path, content_type=None, encoding=None,
+         header=None):
+    """Ответ с файлом full_path без Cache-Control.
+
+    Условные запросы проверяются по ETag и Last-Modified самого файла.
+    Если передан header - пара (заголовок, значение) для фронтового
+    сервера, - тело не отдаётся, иначе файл отдаёт FileResponse.
+    Для сжатого заранее файла encoding - его Content-Encoding.
+    """
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type = (content_type or mimetypes.guess_type(full_path)[0]
+                        or 'application/octet-stream')
+        if header:
+            response = HttpResponse(content_type=content_type)
+            response[header[0]] = header[1]
+        else:
+            response = _file_response(request, full_path, stat,
+                                      content_type, etag)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+def serve(request, path, document_root=None, internal_url=None):
+    """Отдаёт файл path из document_root (по умолчанию MEDIA_ROOT)."""
+    try:
+        full_path = safe_join(document_root or settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404('Файл не найден')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден')
+
+    backend = settings.SENDFILE_BACKEND
+    header = None
+    if backend == 'x-accel-redirect' and internal_url:
+        header = ('X-Accel-Redirect', internal_url + quote(path))
+    elif backend == 'x-sendfile':
+        header = ('X-Sendfile', full_path)
+    response = send(request, full_path, header=header)
+    patch_cache_control(response, public=True, immutable=True,
+                        max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def urlpatterns(prefix, document_root=None, internal_url=None):
+    """Маршрут для serve, как у django.conf.urls.static.static.
+
+    Для адресов на другом домене (CDN) маршрут не нужен.
+    """
+    if not prefix or urlsplit(prefix).netloc:
+        return []
+    return [re_path(r'^%s(?P<path>.*)$' % re.escape(prefix.lstrip('/')),
+                    serve, {'document_root': document_root,
+                            'internal_url': internal_url}, name='media')]
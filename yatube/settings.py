@@ -49,10 +49,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'yatube.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'yatube.timing.ServerTimingMiddleware',
+    'yatube.metrics.MetricsMiddleware',
+    'yatube.loadtest.RequestLogMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -62,7 +66,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени, см. yatube/timing.py
+        'BACKEND': 'yatube.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,18 +83,45 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Тесты пишут файлы во временный каталог, см. yatube/testing.py
+TEST_RUNNER = 'yatube.testing.IsolatedRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 Django, который применяет PRAGMAS к каждому соединению
+        'ENGINE': 'yatube.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение живёт между запросами, а не открывается заново
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 20000,
+            'cache_size': -64000,
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+        },
     }
 }
 
 
+# Запросы дольше стольких секунд пишутся в журнал, None - выключено,
+# см. yatube/slowlog.py и команду slow_queries
+SLOW_QUERY_SECONDS = 0.1
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl')
+
+# Журнал запросов для воспроизведения командой load_test --replay,
+# None - не писать, см. yatube/loadtest.py
+REQUEST_LOG = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -129,18 +161,80 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+# collectstatic добавляет хеши в имена и сжимает файлы заранее,
+# отдаёт их StaticFilesMiddleware, см. yatube/staticfiles.py
+STATICFILES_STORAGE = 'yatube.staticfiles.CompressedManifestStorage'
+STATIC_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+# Файлы без хеша в имени могут измениться при следующей сборке
+STATIC_CACHE_MAX_AGE_UNHASHED = 60
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Медиафайлы отдаёт фронтовой сервер, см. yatube/sendfile.py:
+# 'x-accel-redirect' (nginx), 'x-sendfile' (Apache, lighttpd)
+# или None - файл отдаёт сам Django
+SENDFILE_BACKEND = None
+# Внутренний location nginx, смотрящий в MEDIA_ROOT
+SENDFILE_MEDIA_INTERNAL_URL = '/internal/media/'
+# Имена загрузок не переиспользуются, файлы можно кэшировать на год
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
 # Login
 
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
 # LOGOUT_REDIRECT_URL = "index"
 
+# Пагинация лент: 'cursor' (?after=/?before=) или 'numbered' (?page=)
+POSTS_PAGINATION = 'cursor'
+
+# Авторы с таким числом подписчиков не раскладываются по лентам,
+# их посты подмешиваются в ленту подписок при чтении
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+
+# Страницы лент живут в кэше долго: сигналы сбрасывают их при изменениях
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Версия выкладки в ключах кэша страниц и ETag. None - хеш файлов кода
+# и шаблонов; на нескольких серверах задайте одну строку, например
+# хеш коммита, иначе у каждого сервера будут свои ETag
+RELEASE = None
+
+# Загрузки картинок, см. posts/uploads.py: файлы больше предела
+# отбрасываются при чтении запроса, картинки проверяются по заголовку
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POSTS_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POSTS_IMAGE_MAX_SIDE = 2560
+
+# Миниатюры готовят фоновые потоки, см. posts/thumbnails.py;
+# их метаданные sorl-thumbnail хранятся в кэше, а не в базе
+THUMBNAIL_WORKERS = 2
+# Сколько готовых миниатюр помнить в памяти каждого процесса
+THUMBNAIL_LRU_SIZE = 10000
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+
+# Файлы метрик воркеров для /metrics, см. yatube/metrics.py
+METRICS_DIR = os.path.join(BASE_DIR, 'cache', 'metrics')
+# Кроме сотрудников, /metrics доступна с этих адресов. За nginx
+# REMOTE_ADDR у всех клиентов 127.0.0.1, поэтому по умолчанию список
+# пуст; адреса имеют смысл, только если сборщик метрик ходит
+# к приложению напрямую, минуя прокси
+METRICS_ALLOWED_IPS = []
+
+# Общий для всех воркеров кэш в файле SQLite, см. yatube/cache.py
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'STALE_TIMEOUT': 60,
+            'LOCK_TIMEOUT': 10,
+        },
     }
 }
 
@@ -0,0 +1,131 @@
+"""Журнал медленных запросов к базе.
+
+Бэкенд yatube.sqlite3 ставит log_slow_queries в execute_wrappers
+каждого соединения, поэтому запросы видны и в представлениях, и в
+командах manage.py, и в фоновых потоках. Запрос дольше
+SLOW_QUERY_SECONDS дописывается строкой JSON в SLOW_QUERY_LOG:
+
+    fingerprint - хеш запроса без значений, одинаковый для всех его вызовов;
+    sql, params, seconds, plan - текст, параметры, время и EXPLAIN;
+    view - имя URL или команда manage.py;
+    code, template - строка кода проекта и шаблона, откуда пришёл запрос.
+
+Сводку по журналу строит команда slow_queries.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.template.base import Node
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+SPACES = re.compile(r'\s+')
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def normalize(sql):
+    """Текст запроса без значений: литералы и списки IN схлопнуты."""
+    sql = LITERALS.sub('?', sql)
+    sql = PLACEHOLDER_LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def _caller():
+    """Строка кода проекта и строка шаблона, откуда выполнен запрос."""
+    code = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (code is None or template is None):
+        filename = frame.f_code.co_filename
+        if (code is None and filename.startswith(PROJECT_DIR)
+                and not filename.startswith(os.path.dirname(__file__))
+                and 'site-packages' not in filename):
+            code = (f'{os.path.relpath(filename, PROJECT_DIR)}:'
+                    f'{frame.f_lineno}')
+        node = frame.f_locals.get('self')
+        if (template is None and isinstance(node, Node)
+                and getattr(node, 'token', None) is not None):
+            origin = node.origin
+            template = (f'{origin.template_name or origin.name}:'
+                        f'{node.token.lineno}')
+        frame = frame.f_back
+    return code, template
+
+
+def _view():
+    timings = timing.current()
+    request = getattr(timings, 'request', None)
+    if request is None:
+        return ' '.join(os.path.basename(arg) for arg in sys.argv[:2])
+    match = request.resolver_match
+    return match.view_name if match else request.path
+
+
+def explain(connection, sql, params):
+    """План запроса или None, если его не получить."""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    # Сырой курсор: обёртки не вызываются, результат запроса не теряется
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(prefix + sql, params)
+        return [' '.join(str(value) for value in row)
+                for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
+    finally:
+        cursor.close()
+
+
+def _write(entry):
+    path = settings.SLOW_QUERY_LOG
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+    with open(path, 'a', encoding='utf-8') as log:
+        log.write(line)
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_SECONDS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        if seconds >= threshold:
+            code, template = _caller()
+            connection = context['connection']
+            entry = {
+                'time': time.time(),
+                'fingerprint': fingerprint(sql),
+                'seconds': round(seconds, 6),
+                'sql': sql,
+                'params': None if many else params,
+                'view': _view(),
+                'code': code,
+                'template': template,
+                'plan': None if many else explain(connection, sql, params),
+            }
+            _write(entry)
+            logger.warning('Медленный запрос %.1f мс (%s, %s): %s',
+                           seconds * 1000, entry['view'],
+                           template or code, normalize(sql))
@@ -0,0 +1,34 @@
+"""Бэкенд SQLite, который настраивает каждое новое соединение.
+
+PRAGMA берутся из ключа PRAGMAS в настройках базы, например:
+
+    'PRAGMAS': {'journal_mode': 'WAL', 'busy_timeout': 5000}
+
+Запросы всех соединений проходят через журнал медленных запросов,
+см. yatube/slowlog.py.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+from yatube import slowlog
+
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(slowlog.log_slow_queries)
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            value = str(value)
+            if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(value):
+                raise ImproperlyConfigured(
+                    f'Недопустимая PRAGMA SQLite: {name} = {value}')
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
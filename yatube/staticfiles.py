@@ -0,0 +1,137 @@
+"""Статика с хешами в именах и сжатыми заранее копиями.
+
+collectstatic через CompressedManifestStorage раскладывает в STATIC_ROOT
+файлы с хешем содержимого в имени (bootstrap.min.3f2a1c.css) и рядом
+их сжатые копии .gz и, если установлен пакет brotli, .br. Тег
+{% static %} ссылается на имена с хешем.
+
+StaticFilesMiddleware отдаёт файлы из STATIC_ROOT, выбирая копию по
+Accept-Encoding, так что при запросе ничего не сжимается. Имена с хешем
+кэшируются навсегда, остальные - на STATIC_CACHE_MAX_AGE_UNHASHED.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (ManifestStaticFilesStorage,
+                                                staticfiles_storage)
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from . import sendfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.xml', '.txt',
+                '.html', '.ico', '.ttf', '.otf', '.eot')
+# Content-Encoding и расширение копии в порядке предпочтения
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(data):
+    """Сжатые копии data: пары (расширение, байты)."""
+    yield '.gz', gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress(data)
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | {self.hashed_files.get(self.hash_key(name))
+                              for name in paths}
+        for name in names:
+            if name and name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        for extension, compressed in compress(data):
+            # Сжатая копия, которая не меньше оригинала, не нужна
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(compressed))
+
+    def stored_name(self, name):
+        # До collectstatic (разработка, тесты) ссылки ведут на исходные
+        # имена, как без манифеста
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме запрещённых через q=0."""
+    encodings = set()
+    for item in header.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        quality = next((param[2:] for param in params
+                        if param.startswith('q=')), '1')
+        try:
+            if float(quality) > 0:
+                encodings.add(coding.lower())
+        except ValueError:
+            continue
+    return encodings
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику, см. описание модуля."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        # Имена с хешем из манифеста, прочитанного при запуске
+        self.hashed = set(
+            getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if (request.method in ('GET', 'HEAD')
+                and request.path_info.startswith(self.prefix)):
+            response = self.serve(request,
+                                  request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, path):
+        try:
+            full_path = safe_join(settings.STATIC_ROOT, path)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(full_path):
+            return None
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        content_type = (mimetypes.guess_type(full_path)[0]
+                        or 'application/octet-stream')
+        for encoding, extension in ENCODINGS:
+            if (encoding in accepted
+                    and os.path.isfile(full_path + extension)):
+                response = sendfile.send(request, full_path + extension,
+                                         content_type, encoding)
+                break
+        else:
+            response = sendfile.send(request, full_path, content_type)
+        if path.endswith(COMPRESSIBLE):
+            patch_vary_headers(response, ('Accept-Encoding',))
+        if path in self.hashed:
+            patch_cache_control(response, public=True, immutable=True,
+                                max_age=settings.STATIC_CACHE_MAX_AGE)
+        else:
+            patch_cache_control(
+                response, public=True,
+                max_age=settings.STATIC_CACHE_MAX_AGE_UNHASHED)
+        return response
@@ -0,0 +1,46 @@
+"""Окружение тестов: кэш, метрики и журнал медленных запросов
+во временном каталоге.
+
+Тесты не должны писать в рабочие каталоги рядом с кодом и зависеть
+от того, что там осталось от сервера разработки или прошлых прогонов.
+manage.py test подключает это через TEST_RUNNER, pytest - фикстурой
+из tests/fixtures/fixture_settings.py.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def isolated():
+    directory = tempfile.mkdtemp(prefix='yatube-tests-')
+    # Тот же бэкенд кэша, но свой файл: состояние не переживает прогон
+    caches = {
+        alias: dict(config, LOCATION=os.path.join(directory, f'{alias}.cache'))
+        for alias, config in settings.CACHES.items()
+    }
+    try:
+        with override_settings(
+                CACHES=caches,
+                METRICS_DIR=os.path.join(directory, 'metrics'),
+                SLOW_QUERY_LOG=os.path.join(
+                    directory, 'logs', 'slow_queries.jsonl')):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class IsolatedRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._stack = ExitStack()
+        self._stack.enter_context(isolated())
+
+    def teardown_test_environment(self, **kwargs):
+        self._stack.close()
+        super().teardown_test_environment(**kwargs)
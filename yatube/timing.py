@@ -0,0 +1,177 @@
+"""Время фаз запроса: SQL, шаблоны, кэш, миниатюры.
+
+ServerTimingMiddleware заводит на запрос объект Timings. Код фаз
+отмечает время через record() и phase(), а без активного запроса эти
+вызовы ничего не делают. Итог уходит в заголовок Server-Timing и
+одной строкой в лог yatube.timing, например:
+
+    GET /group/cats/ 200 total=41.2ms sql=12.0ms sql_count=7 ...
+
+Сотрудники (is_staff) могут добавить к адресу ?profile=1 и получить
+вместо страницы сводку cProfile по этому запросу.
+"""
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Фазы в заголовке и их описания, заголовки HTTP - только латиница
+PHASES = (
+    ('sql', 'SQL'),
+    ('tpl', 'Templates'),
+    ('cache', 'Cache'),
+    ('thumb', 'Thumbnails'),
+)
+PROFILE_LINES = 40
+
+_local = threading.local()
+
+
+class Timings:
+    def __init__(self, request=None):
+        self.request = request
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+
+    def add(self, name, seconds, **counts):
+        self.durations[name] += seconds
+        self.counts.update(counts)
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка запросов к базе для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('sql', time.perf_counter() - started, sql_count=1)
+
+    def header(self, total):
+        metrics = []
+        for name, _ in PHASES:
+            if name in self.durations:
+                metrics.append(f'{name};dur={self.durations[name] * 1000:.1f}'
+                               f';desc="{self.describe(name)}"')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def describe(self, name):
+        description = dict(PHASES)[name]
+        counts = ' '.join(f'{key[len(name) + 1:]}={value}'
+                          for key, value in sorted(self.counts.items())
+                          if key.startswith(f'{name}_'))
+        return f'{description} {counts}' if counts else description
+
+    def as_dict(self, total):
+        result = {'total': round(total * 1000, 1)}
+        for name, seconds in self.durations.items():
+            result[name] = round(seconds * 1000, 1)
+        result.update(self.counts)
+        return result
+
+
+def current():
+    """Timings текущего запроса или None."""
+    return getattr(_local, 'timings', None)
+
+
+def record(name, seconds, **counts):
+    timings = current()
+    if timings is not None:
+        timings.add(name, seconds, **counts)
+
+
+@contextmanager
+def phase(name, **counts):
+    """Засекает время блока как фазу name текущего запроса."""
+    if current() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started, **counts)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with phase('tpl', tpl_count=1):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, отмечающий время отрисовки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template,
+                             self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template,
+                             self)
+
+
+def _wants_profile(request):
+    user = getattr(request, 'user', None)
+    return (request.GET.get('profile') == '1'
+            and user is not None and user.is_staff)
+
+
+def _profile_response(profiler):
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+    stats.sort_stats('tottime').print_stats(PROFILE_LINES)
+    return HttpResponse(output.getvalue(),
+                        content_type='text/plain; charset=utf-8')
+
+
+class ServerTimingMiddleware:
+    """Отмечает время фаз запроса, см. описание модуля.
+
+    Стоит после AuthenticationMiddleware: для ?profile=1 нужен
+    request.user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _local.timings = Timings(request)
+        profiler = cProfile.Profile() if _wants_profile(request) else None
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute))
+                if profiler is not None:
+                    response = profiler.runcall(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            _local.timings = None
+        total = time.perf_counter() - started
+
+        if profiler is not None:
+            response = _profile_response(profiler)
+        response['Server-Timing'] = timings.header(total)
+        values = timings.as_dict(total)
+        logger.info(
+            '%s %s %s %s', request.method, request.path,
+            response.status_code,
+            ' '.join(f'{key}={value}ms' if isinstance(value, float)
+                     else f'{key}={value}'
+                     for key, value in values.items()),
+            extra={'timings': values})
+        return response
@@ -4,10 +4,13 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf.urls import handler404, handler500
 
+from . import metrics, sendfile
+
 urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics", metrics.view, name="metrics"),
     path("", include("posts.urls")),
     path('about/', include('about.urls', namespace='about')),
 ]
@@ -15,8 +18,9 @@ urlpatterns = [
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
+urlpatterns += sendfile.urlpatterns(
+    settings.MEDIA_URL, internal_url=settings.SENDFILE_MEDIA_INTERNAL_URL)
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL,
-                          document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL,
                           document_root=settings.STATIC_ROOT)